@@ -0,0 +1,101 @@
+"""partition movie_ratings by month
+
+Revision ID: b7d3e91c05fa
+Revises: 4f1c9b7e2a6d
+Create Date: 2026-10-19 10:41:07.215380
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7d3e91c05fa'
+down_revision: Union[str, Sequence[str], None] = '4f1c9b7e2a6d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Creates (if missing) the partition holding the UTC calendar month of p_month and returns its name.
+# Rows that already landed in the default partition for that month are moved into the new partition.
+ENSURE_PARTITION_FUNCTION = """
+CREATE OR REPLACE FUNCTION ensure_movie_ratings_partition(p_month date) RETURNS text AS $$
+DECLARE
+    v_month timestamp := date_trunc('month', p_month::timestamp);
+    v_start timestamptz := v_month AT TIME ZONE 'UTC';
+    v_end timestamptz := (v_month + interval '1 month') AT TIME ZONE 'UTC';
+    v_name text := 'movie_ratings_y' || to_char(v_month, 'YYYY') || 'm' || to_char(v_month, 'MM');
+BEGIN
+    IF to_regclass(v_name) IS NOT NULL THEN
+        RETURN v_name;
+    END IF;
+    EXECUTE format('CREATE TABLE %I (LIKE movie_ratings INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', v_name);
+    EXECUTE format(
+        'WITH moved AS (DELETE FROM movie_ratings_default WHERE created_at >= %L AND created_at < %L RETURNING *) '
+        'INSERT INTO %I SELECT * FROM moved',
+        v_start, v_end, v_name
+    );
+    EXECUTE format('ALTER TABLE movie_ratings ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)', v_name, v_start, v_end);
+    RETURN v_name;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # a plain table can't be turned into a partitioned one in place: build the new table and copy
+    op.execute("ALTER TABLE movie_ratings RENAME TO movie_ratings_unpartitioned")
+    op.execute("ALTER TABLE movie_ratings_unpartitioned RENAME CONSTRAINT movie_ratings_pkey TO movie_ratings_unpartitioned_pkey")
+    op.execute("""
+        CREATE TABLE movie_ratings (
+            id integer NOT NULL DEFAULT nextval('movie_ratings_id_seq'::regclass),
+            movie_id integer NOT NULL,
+            score integer NOT NULL,
+            created_at timestamp with time zone NOT NULL DEFAULT now(),
+            CONSTRAINT movie_ratings_pkey PRIMARY KEY (id, created_at),
+            CONSTRAINT movie_ratings_movie_id_fkey FOREIGN KEY (movie_id) REFERENCES movies (id) ON DELETE CASCADE
+        ) PARTITION BY RANGE (created_at)
+    """)
+    op.create_index('ix_movie_ratings_movie_id_created_at', 'movie_ratings', ['movie_id', 'created_at'])
+    op.execute("CREATE TABLE movie_ratings_default PARTITION OF movie_ratings DEFAULT")
+    op.execute(ENSURE_PARTITION_FUNCTION)
+
+    # one partition per month from the oldest rating up to three months ahead
+    op.execute("""
+        SELECT ensure_movie_ratings_partition(month::date)
+        FROM generate_series(
+            date_trunc('month', COALESCE((SELECT min(created_at) FROM movie_ratings_unpartitioned), now()) AT TIME ZONE 'UTC'),
+            date_trunc('month', now() AT TIME ZONE 'UTC') + interval '3 months',
+            interval '1 month'
+        ) AS month
+    """)
+    op.execute("""
+        INSERT INTO movie_ratings (id, movie_id, score, created_at)
+        SELECT id, movie_id, score, created_at FROM movie_ratings_unpartitioned
+    """)
+    op.execute("ALTER SEQUENCE movie_ratings_id_seq OWNED BY movie_ratings.id")
+    op.drop_table('movie_ratings_unpartitioned')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("ALTER TABLE movie_ratings RENAME TO movie_ratings_partitioned")
+    op.execute("ALTER TABLE movie_ratings_partitioned RENAME CONSTRAINT movie_ratings_pkey TO movie_ratings_partitioned_pkey")
+    op.create_table('movie_ratings',
+    sa.Column('id', sa.Integer(), server_default=sa.text("nextval('movie_ratings_id_seq'::regclass)"), nullable=False),
+    sa.Column('movie_id', sa.Integer(), nullable=False),
+    sa.Column('score', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.ForeignKeyConstraint(['movie_id'], ['movies.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.execute("""
+        INSERT INTO movie_ratings (id, movie_id, score, created_at)
+        SELECT id, movie_id, score, created_at FROM movie_ratings_partitioned
+    """)
+    op.execute("ALTER SEQUENCE movie_ratings_id_seq OWNED BY movie_ratings.id")
+    op.execute("DROP TABLE movie_ratings_partitioned")
+    op.execute("DROP FUNCTION IF EXISTS ensure_movie_ratings_partition(date)")
@@ -0,0 +1,70 @@
+"""add people and movie_people
+
+Revision ID: c3a8f25d91e4
+Revises: b7d3e91c05fa
+Create Date: 2026-10-19 13:26:52.804913
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3a8f25d91e4'
+down_revision: Union[str, Sequence[str], None] = 'b7d3e91c05fa'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# same normalisation as app.repositories.movie_repo.normalize_person_name
+NORMALIZED = "lower(regexp_replace(trim({0}), '\\s+', ' ', 'g'))"
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('people',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=255), nullable=False),
+    sa.Column('normalized_name', sa.String(length=255), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_people_normalized_name'), 'people', ['normalized_name'], unique=True)
+    op.create_table('movie_people',
+    sa.Column('movie_id', sa.Integer(), nullable=False),
+    sa.Column('person_id', sa.Integer(), nullable=False),
+    sa.Column('position', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['movie_id'], ['movies.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['person_id'], ['people.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('movie_id', 'person_id')
+    )
+    op.create_index('ix_movie_people_person_id', 'movie_people', ['person_id'], unique=False)
+
+    # backfill from the comma separated movies.cast column
+    op.execute(f"""
+        INSERT INTO people (name, normalized_name)
+        SELECT DISTINCT ON (normalized_name) name, normalized_name
+        FROM (
+            SELECT left(regexp_replace(trim(part), '\\s+', ' ', 'g'), 255) AS name, left({NORMALIZED.format('part')}, 255) AS normalized_name
+            FROM movies CROSS JOIN LATERAL unnest(string_to_array(movies."cast", ',')) AS part
+        ) AS names
+        WHERE normalized_name <> ''
+        ORDER BY normalized_name, name
+    """)
+    op.execute(f"""
+        INSERT INTO movie_people (movie_id, person_id, position)
+        SELECT DISTINCT ON (m.id, p.id) m.id, p.id, part.position
+        FROM movies m
+        CROSS JOIN LATERAL unnest(string_to_array(m."cast", ',')) WITH ORDINALITY AS part(name, position)
+        JOIN people p ON p.normalized_name = left({NORMALIZED.format('part.name')}, 255)
+        ORDER BY m.id, p.id, part.position
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_movie_people_person_id', table_name='movie_people')
+    op.drop_table('movie_people')
+    op.drop_index(op.f('ix_people_normalized_name'), table_name='people')
+    op.drop_table('people')
@@ -0,0 +1,192 @@
+"""Adaptive admission control for the API.
+
+Each route class (reads, writes) gets an `AdaptiveLimiter`: at most `limit` requests run at
+once, a bounded FIFO queue absorbs short bursts, and anything beyond that is rejected right
+away so the worker never piles up more work than the database pool can serve.
+
+The limit follows a gradient rule: it is scaled by baseline_latency / recent_latency (and by
+target_latency / recent_latency once the target is exceeded), so it shrinks as soon as queueing
+shows up in the latency of admitted requests, and grows by sqrt(limit) while latency stays at
+its baseline and the limit is actually being used.
+
+Reads and writes share one budget, ADMISSION_CAPACITY (by default the size of the database
+pool, pool size + overflow): a limiter only grows into what the other one leaves free, so
+admitted requests never outnumber the connections they need. Writes start with a third of
+it, reads with the rest.
+"""
+import asyncio
+import math
+import os
+from collections import deque
+from typing import Deque, Optional
+
+from app.db.session import DB_POOL_SIZE, DB_MAX_OVERFLOW
+
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+# requests admitted at once across reads and writes; more would wait on the pool's checkout timeout
+ADMISSION_CAPACITY = max(2, int(os.getenv("ADMISSION_CAPACITY", str(DB_POOL_SIZE + DB_MAX_OVERFLOW))))
+ADMISSION_WRITE_LIMIT = int(os.getenv("ADMISSION_WRITE_LIMIT", str(max(1, ADMISSION_CAPACITY // 3))))
+ADMISSION_READ_LIMIT = int(os.getenv("ADMISSION_READ_LIMIT", str(ADMISSION_CAPACITY - ADMISSION_WRITE_LIMIT)))
+# upper bound of the adaptive limit; FastAPI runs sync endpoints on a 40 thread pool
+ADMISSION_MAX_LIMIT = int(os.getenv("ADMISSION_MAX_LIMIT", "40"))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "50"))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "1.0"))
+# latency of admitted requests (seconds) above which the limit is pushed down
+ADMISSION_TARGET_LATENCY = float(os.getenv("ADMISSION_TARGET_LATENCY", "0.5"))
+
+READ_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+# long-lived streams would hold a slot for their whole lifetime and skew the latency samples
+EXEMPT_PATHS = frozenset({"/api/v1/changes/stream"})
+
+# smoothing factors of the latency averages and of the limit itself
+SHORT_WINDOW = 0.3
+LONG_WINDOW = 0.02
+LIMIT_SMOOTHING = 0.2
+# recent latency may exceed the baseline by this factor before the limit starts shrinking
+LATENCY_TOLERANCE = 1.5
+
+
+class AdaptiveLimiter:
+    """Concurrency limiter with a bounded wait queue and a latency-driven limit.
+
+    Lives on the event loop thread, so no locking is needed.
+    """
+
+    def __init__(self, name: str, initial_limit: int, max_limit: int = ADMISSION_MAX_LIMIT, min_limit: int = 1,
+                 max_queue: int = ADMISSION_MAX_QUEUE, queue_timeout: float = ADMISSION_QUEUE_TIMEOUT,
+                 target_latency: float = ADMISSION_TARGET_LATENCY):
+        self.name = name
+        self.min_limit = min_limit
+        self.max_limit = max(max_limit, min_limit)
+        self.limit = float(min(max(initial_limit, min_limit), self.max_limit))
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.target_latency = target_latency
+        self.in_flight = 0
+        self.waiters: Deque[asyncio.Future] = deque()
+        self.short_latency = None
+        self.long_latency = None
+        self.admitted = 0
+        self.rejected = 0
+        # limiter sharing `capacity` with this one, see share_capacity
+        self.partner: Optional["AdaptiveLimiter"] = None
+        self.capacity = 0
+
+
+    async def acquire(self) -> bool:
+        """Take a slot, waiting in the queue if needed; False means the request must be shed."""
+        if self.in_flight < int(self.limit) and not self.waiters:
+            self.in_flight += 1
+            self.admitted += 1
+            return True
+        if len(self.waiters) >= self.max_queue:
+            self.rejected += 1
+            return False
+
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # the slot was handed over just as we gave up: pass it on
+                self._free_slot()
+            else:
+                waiter.cancel()
+                self.waiters.remove(waiter)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            self.rejected += 1
+            return False
+        self.admitted += 1
+        return True
+
+
+    def release(self, latency: float) -> None:
+        """Give the slot back and feed the request's latency (seconds) into the limit."""
+        self._update_limit(latency)
+        self._free_slot()
+
+
+    def _free_slot(self) -> None:
+        self.in_flight -= 1
+        self._wake_waiters()
+
+
+    def _wake_waiters(self) -> None:
+        # hand free slots to the oldest queued requests, skipping ones that already gave up
+        while self.waiters and self.in_flight < int(self.limit):
+            waiter = self.waiters.popleft()
+            if waiter.done():
+                continue
+            self.in_flight += 1
+            waiter.set_result(True)
+
+
+    def _update_limit(self, latency: float) -> None:
+        if self.short_latency is None:
+            self.short_latency = self.long_latency = latency
+            return
+        self.short_latency += SHORT_WINDOW * (latency - self.short_latency)
+        self.long_latency += LONG_WINDOW * (latency - self.long_latency)
+        if self.long_latency > 2 * self.short_latency:
+            # latency recovered well below the old baseline: let the baseline catch up faster
+            self.long_latency = 0.95 * self.long_latency
+
+        gradient = max(0.5, min(1.0, LATENCY_TOLERANCE * self.long_latency / self.short_latency))
+        if self.short_latency > self.target_latency:
+            gradient = min(gradient, max(0.5, self.target_latency / self.short_latency))
+
+        new_limit = self.limit * gradient
+        # only probe upwards when the limit is what holds requests back
+        if gradient >= 1.0 and self.in_flight >= self.limit / 2:
+            new_limit += math.sqrt(self.limit)
+        new_limit = self.limit + LIMIT_SMOOTHING * (new_limit - self.limit)
+        self.limit = max(min(new_limit, self.ceiling()), self.min_limit)
+
+
+    def ceiling(self) -> float:
+        """Highest limit allowed right now: max_limit, less what the partner limiter holds."""
+        if self.partner is None:
+            return self.max_limit
+        # the partner's requests still in flight count even after its limit dropped below them
+        held = max(self.partner.limit, self.partner.in_flight)
+        return min(self.max_limit, self.capacity - held)
+
+
+    def retry_after(self) -> int:
+        """Seconds a shed client should wait: roughly the time to drain the current backlog."""
+        latency = self.short_latency or 1.0
+        backlog = (self.in_flight + len(self.waiters)) / max(int(self.limit), 1)
+        return max(1, math.ceil(latency * backlog))
+
+
+    def snapshot(self) -> dict:
+        return {
+            "limit": int(self.limit),
+            "in_flight": self.in_flight,
+            "queued": len(self.waiters),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "latency_recent_ms": round(self.short_latency * 1000, 2) if self.short_latency is not None else None,
+            "latency_baseline_ms": round(self.long_latency * 1000, 2) if self.long_latency is not None else None,
+        }
+
+
+def share_capacity(first: AdaptiveLimiter, second: AdaptiveLimiter, capacity: int) -> None:
+    """Bound the two limiters' limits to `capacity` together, scaling down starting limits above it."""
+    first.partner, second.partner = second, first
+    first.capacity = second.capacity = capacity
+    total = first.limit + second.limit
+    if total > capacity:
+        second.limit = float(min(max(math.floor(second.limit * capacity / total), second.min_limit), capacity - first.min_limit))
+        first.limit = float(capacity - second.limit)
+
+
+read_limiter = AdaptiveLimiter("read", ADMISSION_READ_LIMIT)
+write_limiter = AdaptiveLimiter("write", ADMISSION_WRITE_LIMIT)
+share_capacity(read_limiter, write_limiter, ADMISSION_CAPACITY)
+
+
+def limiter_for(method: str) -> AdaptiveLimiter:
+    return read_limiter if method in READ_METHODS else write_limiter
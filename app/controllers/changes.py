@@ -0,0 +1,115 @@
+import asyncio
+import json
+import os
+import time
+from fastapi import APIRouter, Depends, HTTPException, Query, Header, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from typing import Annotated, Optional
+from sqlalchemy.orm import Session
+import logging
+
+from app.db.session import SessionLocal, get_db_session
+from app.services.change_service import ChangeService, MAX_CHANGES_PAGE, parse_cursor
+from app.repositories.change_repo import SqlAlchemyChangeRepository
+from app.schemas.change import ChangeFeedOut
+from app.exceptions.errors import ValidationError
+
+CHANGE_STREAM_POLL_SECONDS = float(os.getenv("CHANGE_STREAM_POLL_SECONDS", "1"))
+CHANGE_STREAM_HEARTBEAT_SECONDS = float(os.getenv("CHANGE_STREAM_HEARTBEAT_SECONDS", "15"))
+CHANGE_STREAM_BATCH_SIZE = 500
+
+router = APIRouter(prefix="/api/v1/changes", tags=["changes"])
+
+logger = logging.getLogger("movie_rating")
+
+def get_change_service(
+    session: Annotated[Session, Depends(get_db_session)],
+) -> ChangeService:
+    return ChangeService(SqlAlchemyChangeRepository(session))
+
+
+@router.get("", response_model=ChangeFeedOut)
+def list_changes(
+        since: Optional[str] = None,
+        limit: Annotated[int, Query(ge=1, le=MAX_CHANGES_PAGE)] = 100,
+        change_service: ChangeService = Depends(get_change_service)
+):
+    logger.info(f"GET changes - since={since}, limit={limit}")
+
+    try:
+        res = change_service.get_changes(since, limit)
+    except ValidationError as e:
+        logger.warning(f"Invalid changes request - since={since}: {e.message}")
+        raise HTTPException(status_code=422, detail={"code": 422, "message": e.message})
+    except Exception as e:
+        logger.error(f"Error reading changes - since={since}: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail={"code": 500, "message": "Internal server error"})
+
+    logger.info(f"Changes retrieved - count={len(res['items'])}, next_cursor={res['next_cursor']}")
+
+    return ChangeFeedOut(
+        status="success",
+        next_cursor=res["next_cursor"],
+        has_more=res["has_more"],
+        data=res["items"]
+    )
+
+
+def _read_changes(cursor: Optional[str]) -> dict:
+    # a short-lived session per poll, an idle stream must not hold a pooled connection
+    with SessionLocal() as session:
+        return ChangeService(SqlAlchemyChangeRepository(session)).get_changes(cursor, CHANGE_STREAM_BATCH_SIZE)
+
+
+@router.get("/stream")
+async def stream_changes(
+        request: Request,
+        since: Optional[str] = None,
+        last_event_id: Annotated[Optional[str], Header()] = None
+):
+    """Server-Sent Events: one `change` event per feed entry, its cursor as the event id.
+
+    Reconnecting clients resume from the Last-Event-ID header, which takes precedence over `since`.
+    """
+    cursor = last_event_id or since
+    logger.info(f"GET changes stream - cursor={cursor}")
+    try:
+        parse_cursor(cursor)
+    except ValidationError as e:
+        logger.warning(f"Invalid changes stream request - cursor={cursor}: {e.message}")
+        raise HTTPException(status_code=422, detail={"code": 422, "message": e.message})
+
+    async def events():
+        nonlocal cursor
+        yield f"retry: {int(CHANGE_STREAM_POLL_SECONDS * 1000) + 1000}\n\n"
+        last_sent = time.monotonic()
+        while not await request.is_disconnected():
+            try:
+                page = await run_in_threadpool(_read_changes, cursor)
+            except Exception as e:
+                # keep the stream open across database hiccups, the next poll retries from the same cursor
+                logger.error(f"Error polling changes stream - cursor={cursor}: {str(e)}", exc_info=True)
+                page = {"items": [], "next_cursor": cursor, "has_more": False}
+
+            for item in page["items"]:
+                yield f"id: {item['cursor']}\nevent: change\ndata: {json.dumps(jsonable_encoder(item))}\n\n"
+            if page["items"]:
+                last_sent = time.monotonic()
+            cursor = page["next_cursor"]
+            if page["has_more"]:
+                continue
+
+            if time.monotonic() - last_sent >= CHANGE_STREAM_HEARTBEAT_SECONDS:
+                # comment line, keeps proxies from closing an idle connection
+                yield ": keep-alive\n\n"
+                last_sent = time.monotonic()
+            await asyncio.sleep(CHANGE_STREAM_POLL_SECONDS)
+        logger.info(f"Changes stream closed - cursor={cursor}")
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,15 +1,18 @@
 from fastapi import status
 from fastapi.responses import Response
-from fastapi import APIRouter, Depends, HTTPException
-from typing import Annotated, Optional, List
+from fastapi import APIRouter, Depends, HTTPException, Query, Header
+from datetime import datetime
+from typing import Annotated, Optional, List, Literal
 from sqlalchemy.orm import Session
 import logging
 
 from app.db.session import get_db_session
 from app.services.movie_service import MovieService
+from app.services.title_index import MAX_SUGGESTIONS
 from app.repositories.movie_repo import SqlAlchemyMovieRepository
-from app.schemas.movie import MovieCreate, RatingCreate, MovieListItem, MovieSummaryOut, MovieFullInfoOut, MovieSingleItem
-from app.exceptions.errors import NotFoundError, ValidationError
+from app.repositories.change_repo import SqlAlchemyChangeRepository
+from app.schemas.movie import MovieCreate, RatingCreate, MovieListItem, MovieFullInfoOut, MovieSingleItem, MovieBatchEntry, MovieBatchItem, MoviePatch, MovieUpdatedOut, MovieUpdatedItem, MovieBulkDelete, RatingTrendOut, SimilarMovieOut, SimilarMoviesOut, TitleSuggestionOut, TitleSuggestionsOut
+from app.exceptions.errors import NotFoundError, ValidationError, PreconditionFailedError, ServiceUnavailableError
 
 router = APIRouter(prefix="/api/v1/movies", tags=["movies"])
 
@@ -19,7 +22,24 @@ def get_service(
     session: Annotated[Session, Depends(get_db_session)],
 ) -> MovieService:
     repository = SqlAlchemyMovieRepository(session)
-    return MovieService(repository)
+    return MovieService(repository, SqlAlchemyChangeRepository(session))
+
+
+def _etag(version: int) -> str:
+    return f'"{version}"'
+
+
+def _parse_if_match(if_match: Optional[str]) -> Optional[int]:
+    """Turn an If-Match header ('"3"', 'W/"3"' or '*') into the expected movie version."""
+    if if_match is None or if_match.strip() == "*":
+        return None
+    tag = if_match.strip()
+    if tag.startswith("W/"):
+        tag = tag[2:]
+    try:
+        return int(tag.strip('"'))
+    except ValueError:
+        raise ValidationError("If-Match must be an ETag returned by this API")
 
 
 @router.get("/", response_model=MovieListItem)
@@ -29,18 +49,18 @@ def list_all_movies_with_query_params(
         movie_service: MovieService = Depends(get_service),
         title: Optional[str] = None,
         release_year: Optional[int] = None,
-        genre: Optional[str] = None
+        genre: Optional[str] = None,
+        cast: Optional[str] = None
 ):
     logger.info(
         f"GET movies list - page={page}, page_size={page_size}, "
-        f"title={title}, release_year={release_year}, genre={genre}"
+        f"title={title}, release_year={release_year}, genre={genre}, cast={cast}"
     )
 
     try:
-        res = movie_service.filter_movies(page, page_size, title, release_year, genre)
-
-        # Convert ORM objects to Pydantic models
-        movie_items = [MovieSummaryOut.model_validate(m) for m in res["items"]]
+        # concurrent identical requests share one query, items come back as MovieSummaryOut
+        res = movie_service.filter_movies_coalesced(page, page_size, title, release_year, genre, cast)
+        movie_items = res["items"]
 
         # Log successful response
         logger.info(
@@ -61,17 +81,69 @@ def list_all_movies_with_query_params(
         raise HTTPException(status_code=500, detail={"code": 500, "message": "Internal server error"})
 
 
+# registered before /{movie_id} so "suggest" is not taken for an id
+@router.get("/suggest", response_model=TitleSuggestionsOut)
+def suggest_movie_titles(
+        q: str,
+        limit: Annotated[int, Query(ge=1, le=MAX_SUGGESTIONS)] = 10,
+        movie_service: MovieService = Depends(get_service)
+):
+    logger.info(f"GET title suggestions - q={q}, limit={limit}")
+
+    try:
+        suggestions = movie_service.suggest_titles(q, limit)
+    except ValidationError as e:
+        logger.warning(f"Invalid title suggestion request - q={q}: {e.message}")
+        raise HTTPException(status_code=422, detail={"code": 422, "message": e.message})
+    except ServiceUnavailableError as e:
+        logger.warning(f"Title suggestions unavailable - q={q}: {e.message}")
+        raise HTTPException(status_code=503, detail={"code": 503, "message": e.message})
+    except Exception as e:
+        logger.error(f"Error suggesting titles - q={q}: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail={"code": 500, "message": "Internal server error"})
+
+    return TitleSuggestionsOut(
+        status="success",
+        query=q,
+        data=[TitleSuggestionOut(id=movie_id, title=title, ratings_count=count) for movie_id, title, count in suggestions]
+    )
+
+
+@router.get("/batch", response_model=MovieBatchItem)
+def get_movies_by_ids(ids: Annotated[List[int], Query()], movie_service: MovieService = Depends(get_service)):
+    logger.info(f"GET movies batch - ids_count={len(ids)}")
+
+    try:
+        movies = movie_service.get_movies(ids)
+        entries = [
+            MovieBatchEntry(id=movie_id, found=m is not None, data=MovieFullInfoOut.model_validate(m) if m is not None else None)
+            for movie_id, m in zip(ids, movies)
+        ]
+    except ValidationError as e:
+        logger.warning(f"Invalid movies batch request - {e.message}")
+        raise HTTPException(status_code=422, detail={"code": 422, "message": e.message})
+    except Exception as e:
+        logger.error(f"Error getting movies batch: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail={"code": 500, "message": "Internal server error"})
+
+    logger.info(
+        f"Movies batch retrieved - requested={len(ids)}, "
+        f"found={sum(1 for e in entries if e.found)}"
+    )
+
+    return MovieBatchItem(
+        status="success",
+        data=entries
+    )
+
+
 @router.get("/{movie_id}", response_model=MovieSingleItem)
-def get_movie_by_id(movie_id: int, movie_service: MovieService = Depends(get_service)):
+def get_movie_by_id(movie_id: int, response: Response, movie_service: MovieService = Depends(get_service)):
     logger.info(f"GET movie details - movie_id={movie_id}")
 
     try:
-        m = movie_service.get_movie(movie_id)
-        if not m:
-            logger.warning(f"Movie not found - movie_id={movie_id}")
-            raise NotFoundError()
-
-        movie = MovieFullInfoOut.model_validate(m)
+        movie = movie_service.get_movie_coalesced(movie_id)
+        response.headers["ETag"] = _etag(movie.version)
         logger.info(f"Movie details retrieved - movie_id={movie_id}, title={movie.title}")
 
         return MovieSingleItem(
@@ -146,6 +218,93 @@ def add_rating_to_a_movie(movie_id: int, payload: RatingCreate, movie_service: M
     }
 
 
+@router.get("/{movie_id}/similar", response_model=SimilarMoviesOut)
+def get_similar_movies(
+        movie_id: int,
+        limit: Annotated[int, Query(ge=1, le=100)] = 10,
+        movie_service: MovieService = Depends(get_service)
+):
+    logger.info(f"GET similar movies - movie_id={movie_id}, limit={limit}")
+
+    try:
+        similar = movie_service.get_similar(movie_id, limit)
+    except NotFoundError:
+        logger.warning(f"Movie not found in similar movies index - movie_id={movie_id}")
+        raise HTTPException(status_code=404, detail={"code": 404, "message": "Movie not found"})
+    except ServiceUnavailableError as e:
+        logger.warning(f"Similar movies unavailable - movie_id={movie_id}: {e.message}")
+        raise HTTPException(status_code=503, detail={"code": 503, "message": e.message})
+    except Exception as e:
+        logger.error(f"Error getting similar movies - movie_id={movie_id}: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail={"code": 500, "message": "Internal server error"})
+
+    return SimilarMoviesOut(
+        status="success",
+        movie_id=movie_id,
+        data=[SimilarMovieOut(movie_id=similar_id, score=score) for similar_id, score in similar]
+    )
+
+
+@router.get("/{movie_id}/ratings/trend", response_model=RatingTrendOut)
+def get_rating_trend_of_a_movie(
+        movie_id: int,
+        bucket: Literal["day", "week", "month"] = "day",
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        movie_service: MovieService = Depends(get_service)
+):
+    logger.info(f"GET rating trend - movie_id={movie_id}, bucket={bucket}, since={since}, until={until}")
+
+    try:
+        res = movie_service.get_rating_trend(movie_id, bucket, since, until)
+    except NotFoundError:
+        logger.warning(f"Movie not found for rating trend - movie_id={movie_id}")
+        raise HTTPException(status_code=404, detail={"code": 404, "message": "Movie not found"})
+    except ValidationError as e:
+        logger.warning(f"Invalid rating trend request - movie_id={movie_id}: {e.message}")
+        raise HTTPException(status_code=422, detail={"code": 422, "message": e.message})
+    except Exception as e:
+        logger.error(f"Error getting rating trend - movie_id={movie_id}: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail={"code": 500, "message": "Internal server error"})
+
+    logger.info(f"Rating trend retrieved - movie_id={movie_id}, buckets={len(res['items'])}")
+
+    return RatingTrendOut(
+        status="success",
+        movie_id=movie_id,
+        bucket=bucket,
+        since=res["since"],
+        until=res["until"],
+        data=res["items"]
+    )
+
+
+@router.post("/bulk-delete")
+def delete_movies_in_bulk(payload: MovieBulkDelete, movie_service: MovieService = Depends(get_service)):
+    logger.info(
+        f"POST bulk delete movies - ids_count={len(payload.ids) if payload.ids is not None else None}, "
+        f"title={payload.title}, release_year={payload.release_year}, genre={payload.genre}"
+    )
+
+    try:
+        deleted = movie_service.remove_movies(payload.ids, payload.title, payload.release_year, payload.genre)
+    except ValidationError as e:
+        logger.warning(f"Invalid bulk delete request - {e.message}")
+        raise HTTPException(status_code=422, detail={"code": 422, "message": e.message})
+    except Exception as e:
+        logger.error(f"Error deleting movies in bulk: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail={"code": 500, "message": "Internal server error"})
+
+    logger.info(f"Movies deleted in bulk - deleted_count={deleted}")
+
+    return {
+        "status": "success",
+        "data": {
+            "deleted_count": deleted
+        }
+    }
+
+
 @router.delete("/{movie_id}", status_code=status.HTTP_204_NO_CONTENT, response_class=Response)
 def delete_movie_by_id(movie_id: int, movie_service: MovieService = Depends(get_service)):
     logger.info(f"DELETE movie - movie_id={movie_id}")
@@ -189,4 +348,39 @@ def update_movie_by_id(
     return MovieSingleItem(
         status="success",
         data=[movie]
+    )
+
+
+@router.patch("/{movie_id}", response_model=MovieUpdatedItem)
+def patch_movie_by_id(
+        movie_id: int,
+        payload: MoviePatch,
+        response: Response,
+        if_match: Annotated[Optional[str], Header()] = None,
+        movie_service: MovieService = Depends(get_service)
+):
+    logger.info(f"PATCH update movie - movie_id={movie_id}, fields={sorted(payload.model_fields_set)}, if_match={if_match}")
+
+    try:
+        m = movie_service.patch_movie(movie_id, payload.model_dump(exclude_unset=True), _parse_if_match(if_match))
+        movie = MovieUpdatedOut.model_validate(m)
+    except NotFoundError:
+        logger.warning(f"Movie not found for patch - movie_id={movie_id}")
+        raise HTTPException(status_code=404, detail={"code": 404, "message": "Movie not found"})
+    except PreconditionFailedError as e:
+        logger.warning(f"Version conflict patching movie - movie_id={movie_id}, if_match={if_match}")
+        raise HTTPException(status_code=412, detail={"code": 412, "message": e.message})
+    except ValidationError as e:
+        logger.warning(f"Validation error patching movie - movie_id={movie_id}: {e.message}")
+        raise HTTPException(status_code=422, detail={"code": 422, "message": e.message})
+    except Exception as e:
+        logger.error(f"Error patching movie - movie_id={movie_id}: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail={"code": 500, "message": "Internal server error"})
+
+    response.headers["ETag"] = _etag(movie.version)
+    logger.info(f"Movie patched successfully - movie_id={movie_id}, version={movie.version}")
+
+    return MovieUpdatedItem(
+        status="success",
+        data=[movie]
     )
\ No newline at end of file
@@ -0,0 +1,41 @@
+from fastapi import APIRouter, Depends, HTTPException
+import logging
+
+from app.controllers.movies import get_service
+from app.services.movie_service import MovieService
+from app.schemas.movie import MovieListItem, MovieSummaryOut
+from app.exceptions.errors import ValidationError
+
+router = APIRouter(prefix="/api/v1/people", tags=["people"])
+
+logger = logging.getLogger("movie_rating")
+
+
+@router.get("/{name}/movies", response_model=MovieListItem)
+def list_movies_of_a_person(
+        name: str,
+        page: int = 1,
+        page_size: int = 10,
+        movie_service: MovieService = Depends(get_service)
+):
+    logger.info(f"GET movies of person - name={name}, page={page}, page_size={page_size}")
+
+    try:
+        res = movie_service.movies_by_person(name, page, page_size)
+        movie_items = [MovieSummaryOut.model_validate(m) for m in res["items"]]
+    except ValidationError as e:
+        logger.warning(f"Invalid person movies request - name={name}: {e.message}")
+        raise HTTPException(status_code=422, detail={"code": 422, "message": e.message})
+    except Exception as e:
+        logger.error(f"Error retrieving movies of person - name={name}: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail={"code": 500, "message": "Internal server error"})
+
+    logger.info(f"Movies of person retrieved - name={name}, total_items={res['total_items']}, items_count={len(movie_items)}")
+
+    return MovieListItem(
+        status="success",
+        page=res["page"],
+        page_size=res["page_size"],
+        total_items=res["total_items"],
+        data=movie_items
+    )
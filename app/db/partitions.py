@@ -0,0 +1,101 @@
+"""Maintenance of the monthly partitions of `movie_ratings`.
+
+The partitions themselves are created by the `ensure_movie_ratings_partition(date)` SQL
+function installed by the partitioning migration. This module makes sure the upcoming
+months exist and optionally detaches months that fall out of the retention window.
+It runs on server start and then every RATINGS_PARTITION_MAINTENANCE_SECONDS in the
+launcher (see `app.server`), and can be scheduled on its own, e.g. from cron:
+
+    0 3 * * * cd /app && python -m app.db.partitions
+
+Rows left in the default partition mean ratings arrived for a month without a partition;
+each run logs an error while there are any.
+"""
+import logging
+import os
+import re
+from datetime import date, datetime, timezone
+from typing import List
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from app.db.session import engine
+
+# how many months after the current one get a partition in advance
+RATINGS_PARTITION_MONTHS_AHEAD = int(os.getenv("RATINGS_PARTITION_MONTHS_AHEAD", "3"))
+# number of past months to keep attached; 0 keeps everything
+RATINGS_RETENTION_MONTHS = int(os.getenv("RATINGS_RETENTION_MONTHS", "0"))
+# keep detached months as movie_ratings_archive_* tables instead of dropping them
+RATINGS_ARCHIVE_DETACHED = os.getenv("RATINGS_ARCHIVE_DETACHED", "true").lower() == "true"
+
+PARTITION_NAME = re.compile(r"^movie_ratings_y(\d{4})m(\d{2})$")
+
+logger = logging.getLogger("movie_rating")
+
+
+def _shift_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def ensure_rating_partitions(connection: Connection, months_ahead: int = RATINGS_PARTITION_MONTHS_AHEAD) -> List[str]:
+    """Create the partitions for the current UTC month and the next `months_ahead` months."""
+    current = datetime.now(timezone.utc).date().replace(day=1)
+    months = [_shift_months(current, offset) for offset in range(months_ahead + 1)]
+    return [
+        connection.execute(text("SELECT ensure_movie_ratings_partition(:month)"), {"month": month}).scalar_one()
+        for month in months
+    ]
+
+
+def apply_rating_retention(connection: Connection, keep_months: int, archive: bool = RATINGS_ARCHIVE_DETACHED) -> List[str]:
+    """Detach the partitions older than `keep_months` full months; archive (rename) or drop them."""
+    cutoff = _shift_months(datetime.now(timezone.utc).date().replace(day=1), -keep_months)
+    partitions = connection.execute(text(
+        "SELECT child.relname FROM pg_inherits "
+        "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+        "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "WHERE parent.relname = 'movie_ratings'"
+    )).scalars().all()
+
+    detached = []
+    for name in sorted(partitions):
+        match = PARTITION_NAME.match(name)
+        if not match or date(int(match.group(1)), int(match.group(2)), 1) >= cutoff:
+            continue
+        connection.execute(text(f'ALTER TABLE movie_ratings DETACH PARTITION "{name}"'))
+        if archive:
+            connection.execute(text(f'ALTER TABLE "{name}" RENAME TO "{name.replace("movie_ratings_", "movie_ratings_archive_", 1)}"'))
+        else:
+            connection.execute(text(f'DROP TABLE "{name}"'))
+        detached.append(name)
+    return detached
+
+
+def count_default_partition_rows(connection: Connection) -> int:
+    """Ratings in the default partition; creating a month's partition moves its rows out, so this should be 0."""
+    return connection.execute(text("SELECT count(*) FROM movie_ratings_default")).scalar_one()
+
+
+def maintain_rating_partitions() -> None:
+    with engine.begin() as connection:
+        created = ensure_rating_partitions(connection)
+        logger.info(f"Rating partitions ensured - up to {created[-1]}")
+        if RATINGS_RETENTION_MONTHS > 0:
+            detached = apply_rating_retention(connection, RATINGS_RETENTION_MONTHS)
+            action = "archived" if RATINGS_ARCHIVE_DETACHED else "dropped"
+            logger.info(f"Rating partitions {action} by retention - {detached or 'none'}")
+        stray = count_default_partition_rows(connection)
+        if stray:
+            logger.error(
+                f"Default rating partition holds {stray} row(s) outside the monthly partitions, "
+                f"check their created_at and RATINGS_PARTITION_MONTHS_AHEAD"
+            )
+
+
+if __name__ == "__main__":
+    from app.logging_config import setup_logging
+
+    setup_logging()
+    maintain_rating_partitions()
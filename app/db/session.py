@@ -1,15 +1,82 @@
+import logging
 import os
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, text
 from sqlalchemy.orm import sessionmaker, Session
 from dotenv import load_dotenv
-from typing import Generator
+from typing import Callable, Generator
 
 load_dotenv()
 
+logger = logging.getLogger("movie_rating")
+
 DATABASE_URL = os.getenv("DATABASE_URL")
-engine = create_engine(DATABASE_URL, future=True)
+ALCHEMY_ECHO = os.getenv("ALCHEMY_ECHO", "false").lower() == "true"
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+
+engine = create_engine(
+    DATABASE_URL,
+    future=True,
+    echo=ALCHEMY_ECHO,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_pre_ping=True,
+)
 SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
 
+# bumped after every commit that wrote something; in-process read caches compare against it
+_write_generation = 0
+
+
+def write_generation() -> int:
+    return _write_generation
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _mark_flushed_writes(session, flush_context):
+    session.info["has_writes"] = True
+
+
+@event.listens_for(SessionLocal, "do_orm_execute")
+def _mark_statement_writes(orm_execute_state):
+    # bulk INSERT/UPDATE/DELETE statements bypass the flush
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info["has_writes"] = True
+
+
+def run_after_commit(session: Session, callback: Callable[[], None]) -> None:
+    """Run `callback` once the session's current transaction has committed; it is dropped on rollback."""
+    if not session.in_transaction():
+        # tie the callback to a transaction, a rollback with none open fires no event
+        session.begin()
+    session.info.setdefault("after_commit", []).append(callback)
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _after_commit(session):
+    global _write_generation
+    if session.info.pop("has_writes", False):
+        _write_generation += 1
+    for callback in session.info.pop("after_commit", []):
+        try:
+            callback()
+        except Exception as e:
+            # the data is committed already, a failing in-memory follow-up must not turn into an error
+            logger.error(f"After-commit callback failed: {str(e)}", exc_info=True)
+
+
+# after_soft_rollback also fires when rollback() runs before any SQL reached the database
+@event.listens_for(SessionLocal, "after_soft_rollback")
+def _forget_writes(session, previous_transaction):
+    if previous_transaction.nested:
+        return
+    session.info.pop("has_writes", None)
+    session.info.pop("after_commit", None)
+
 
 def get_db_session() -> Generator[Session, None, None]:
     """FastAPI dependency to get database session.
@@ -25,4 +92,21 @@ def get_db_session() -> Generator[Session, None, None]:
         session.rollback()
         raise
     finally:
-        session.close()
\ No newline at end of file
+        session.close()
+
+
+def warm_pool(size: int = DB_POOL_SIZE) -> None:
+    """Open `size` pooled connections up front so the first requests don't pay for connecting.
+
+    Connections are checked out together (otherwise the pool would hand back the same one)
+    and returned to the pool once each has answered a trivial query.
+    """
+    connections = []
+    try:
+        for _ in range(size):
+            connection = engine.connect()
+            connection.execute(text("SELECT 1"))
+            connections.append(connection)
+    finally:
+        for connection in connections:
+            connection.close()
@@ -6,5 +6,17 @@ class NotFoundError(Exception):
 
 class ValidationError(Exception):
     def __init__(self, message: str = "Validation Error"):
+        self.message = message
+        super().__init__(message)
+
+
+class PreconditionFailedError(Exception):
+    def __init__(self, message: str = "Precondition Failed"):
+        self.message = message
+        super().__init__(message)
+
+
+class ServiceUnavailableError(Exception):
+    def __init__(self, message: str = "Service Unavailable"):
         self.message = message
         super().__init__(message)
\ No newline at end of file
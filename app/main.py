@@ -1,9 +1,18 @@
+import time
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
 from fastapi.responses import JSONResponse
-from app.controllers import movies
-from app.db.session import engine
-from app.db.base import Base
-from app.exceptions.errors import NotFoundError, ValidationError
+from sqlalchemy.orm import configure_mappers
+from app.admission import ADMISSION_ENABLED, EXEMPT_PATHS, limiter_for, read_limiter, write_limiter
+from app.controllers import changes, movies, people
+from app.db.partitions import maintain_rating_partitions
+from app.db.session import SessionLocal, engine, warm_pool
+from app.profiling import PROFILING_ENABLED, install_sql_timing, profile_requests
+from app.repositories.movie_repo import SqlAlchemyMovieRepository
+from app.services.similar_index import similar_index
+from app.services.singleflight import movie_details_flight, movie_list_flight
+from app.services.title_index import title_index
+from app.exceptions.errors import NotFoundError, ValidationError, PreconditionFailedError
 import logging
 
 from app.logging_config import setup_logging
@@ -13,10 +22,49 @@ from app import models # noqa: F401
 setup_logging()
 logger = logging.getLogger("movie_rating")
 
-app = FastAPI(title="Movie Rating System API")
+
+
+def load_title_rows():
+    with SessionLocal() as session:
+        return SqlAlchemyMovieRepository(session).get_title_rows()
+
+
+def warm_up():
+    """Prepare a worker before it accepts traffic: build the ORM mappers, map the similar movies index,
+    fill the connection pool and build the title autocomplete index."""
+    configure_mappers()
+    if not similar_index.load():
+        logger.warning("Similar movies index not found, /similar answers 503 until it is built")
+    try:
+        warm_pool()
+        logger.info("Connection pool warmed up")
+    except Exception as e:
+        # the pool reconnects lazily (pool_pre_ping), so a cold start is slower but not fatal
+        logger.error(f"Connection pool warm-up failed: {str(e)}", exc_info=True)
+    try:
+        title_index.build(load_title_rows())
+        logger.info(f"Title index built - movies={len(title_index)}")
+    except Exception as e:
+        # /suggest answers 503 until the periodic refresh manages to build it
+        logger.error(f"Building the title index failed: {str(e)}", exc_info=True)
+    title_index.start_refresh(load_title_rows)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    warm_up()
+    yield
+    title_index.stop_refresh()
+    engine.dispose()
+    logger.info("Database connections closed")
+
+
+app = FastAPI(title="Movie Rating System API", lifespan=lifespan)
 
 
 app.include_router(movies.router)
+app.include_router(people.router)
+app.include_router(changes.router)
 
 
 @app.exception_handler(NotFoundError)
@@ -31,6 +79,12 @@ async def validation_handler(request: Request, exc: ValidationError):
     return JSONResponse(status_code=422, content={"status": "error", "error": {"code": 422, "message": exc.message}})
 
 
+@app.exception_handler(PreconditionFailedError)
+async def precondition_failed_handler(request: Request, exc: PreconditionFailedError):
+    logger.warning(f"Precondition failed: {exc.message}")
+    return JSONResponse(status_code=412, content={"status": "error", "error": {"code": 412, "message": exc.message}})
+
+
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
     logger.info(f"Incoming request: {request.method} {request.url.path}")
@@ -42,13 +96,59 @@ async def log_requests(request: Request, call_next):
         logger.error(f"Request failed: {str(e)}", exc_info=True)
         raise
 
+
+# only registered when a profile token or sample rate is configured
+if PROFILING_ENABLED:
+    install_sql_timing(engine)
+    app.middleware("http")(profile_requests)
+
+
+# registered last so it is the outermost middleware: shed requests cost no further work
+@app.middleware("http")
+async def admission_control(request: Request, call_next):
+    # only API routes are limited; /, /metrics and the docs stay reachable under overload
+    if not ADMISSION_ENABLED or not request.url.path.startswith("/api/") or request.url.path in EXEMPT_PATHS:
+        return await call_next(request)
+
+    limiter = limiter_for(request.method)
+    if not await limiter.acquire():
+        retry_after = limiter.retry_after()
+        logger.warning(f"Shedding {request.method} {request.url.path}: {limiter.name} limit {int(limiter.limit)} reached")
+        return JSONResponse(
+            status_code=503,
+            content={"status": "error", "error": {"code": 503, "message": "Server is overloaded, retry later"}},
+            headers={"Retry-After": str(retry_after)},
+        )
+
+    started = time.perf_counter()
+    try:
+        return await call_next(request)
+    finally:
+        limiter.release(time.perf_counter() - started)
+
+
 @app.get("/")
 async def root():
     logger.info("Root endpoint accessed")
     return {"status": "ok", "message": "Movie Rating Backend is up"}
 
+
+@app.get("/metrics")
+async def metrics():
+    return {
+        "admission": {"read": read_limiter.snapshot(), "write": write_limiter.snapshot()},
+        "singleflight": {"movie_details": movie_details_flight.stats(), "movie_list": movie_list_flight.stats()},
+        "similar_index": similar_index.stats(),
+    }
+
+
 def create_db():
-    Base.metadata.create_all(bind=engine)
+    # create_all would make movie_ratings a partitioned table without partitions (and without the
+    # function creating them), so the schema comes from the migrations, as in app.server
+    from app.server import run_migrations
+    run_migrations()
+    setup_logging()
+    maintain_rating_partitions()
 
 
 if __name__ == "__main__":
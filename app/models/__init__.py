@@ -2,5 +2,7 @@ from app.models.movie import Movie
 from app.models.director import Director
 from app.models.genre import Genre
 from app.models.rating import MovieRating
+from app.models.person import Person
+from app.models.change_event import ChangeEvent
 
-__all__ = ["Movie", "Director", "Genre", "MovieRating"]
+__all__ = ["Movie", "Director", "Genre", "MovieRating", "Person", "ChangeEvent"]
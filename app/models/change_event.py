@@ -0,0 +1,28 @@
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import BigInteger, DateTime, Index, String, text
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy.sql import func
+
+from app.db.base import Base
+
+class ChangeEvent(Base):
+    """Outbox row describing one movie or rating mutation, written in the transaction that made it"""
+
+    __tablename__ = "change_events"
+    #the change feed reads in (tx_id, id) order
+    __table_args__ = (
+        Index("ix_change_events_tx_id_id", "tx_id", "id"),
+    )
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    #id of the writing transaction, filled in by postgres
+    tx_id: Mapped[int] = mapped_column(BigInteger, nullable=False, server_default=text("(pg_current_xact_id()::text)::bigint"))
+    entity: Mapped[str] = mapped_column(String(20), nullable=False) #movie or rating
+    op: Mapped[str] = mapped_column(String(10), nullable=False) #create, update or delete
+    entity_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    movie_id: Mapped[int] = mapped_column(nullable=False)
+    #state after the change, None for deletes
+    payload: Mapped[Optional[dict]] = mapped_column(JSONB, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, server_default=func.now())
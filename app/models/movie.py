@@ -1,6 +1,6 @@
 from typing import List, Optional
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy import ForeignKey, String, Table, Column, Integer, Text
+from sqlalchemy import ForeignKey, String, Table, Column, Integer, Text, Index
 
 from app.db.base import Base
 
@@ -13,6 +13,18 @@ movie_genres = Table(
     Column("genre_id", Integer, ForeignKey("genres.id", ondelete="CASCADE"), primary_key=True)
 )
 
+# association table for many-to-many relationship between movies and cast members
+movie_people = Table(
+    "movie_people",
+    Base.metadata,
+    Column("movie_id", Integer, ForeignKey("movies.id", ondelete="CASCADE"), primary_key=True),
+    Column("person_id", Integer, ForeignKey("people.id", ondelete="CASCADE"), primary_key=True),
+    #billing order within Movie.cast
+    Column("position", Integer, nullable=False),
+    #"movies of person X" is answered from this index
+    Index("ix_movie_people_person_id", "person_id"),
+)
+
 class Movie(Base):
     """Movie model"""
 
@@ -23,12 +35,20 @@ class Movie(Base):
     director_id: Mapped[int] = mapped_column(ForeignKey("directors.id", ondelete="RESTRICT"), nullable=False)
     release_year: Mapped[int] = mapped_column(nullable=False)
     cast: Mapped[str] = mapped_column(Text, nullable=True)
+    #optimistic-locking counter, bumped by the repository on every update (exposed as the ETag)
+    version: Mapped[int] = mapped_column(Integer, nullable=False, default=1, server_default="1")
 
     #one-to-many relationship between directors and movies
     director: Mapped["Director"] = relationship("Director", back_populates="movies")
     #many-to-many relationship between movies and genres
-    genres: Mapped[List["Genre"]] = relationship("Genre", secondary="movie_genres", back_populates="movies")
+    genres: Mapped[List["Genre"]] = relationship("Genre", secondary="movie_genres", back_populates="movies", passive_deletes=True)
+    #many-to-many relationship between movies and cast members, kept in sync with `cast` by the repository
+    people: Mapped[List["Person"]] = relationship("Person", secondary="movie_people", back_populates="movies", passive_deletes=True, order_by="movie_people.c.position")
     #one-to-many relationship between movies and ratings
-    ratings: Mapped[List["MovieRating"]] = relationship("MovieRating", back_populates="movie", cascade="all, delete-orphan")
+    #passive_deletes: rows are removed by the ON DELETE CASCADE foreign keys, never loaded just to be deleted
+    ratings: Mapped[List["MovieRating"]] = relationship("MovieRating", back_populates="movie", cascade="all, delete-orphan", passive_deletes=True)
+
+    #UPDATEs are issued as "... WHERE id = :id AND version = :loaded_version"
+    __mapper_args__ = {"version_id_col": version, "version_id_generator": False}
 
 
@@ -0,0 +1,18 @@
+from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy import String
+from typing import List
+
+from app.db.base import Base
+
+class Person(Base):
+    """Cast member, parsed out of Movie.cast"""
+
+    __tablename__ = "people"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    name: Mapped[str] = mapped_column(String(255), nullable=False)
+    #lower-cased, whitespace-collapsed name; lookups by name go through its unique index
+    normalized_name: Mapped[str] = mapped_column(String(255), nullable=False, unique=True, index=True)
+
+    #many-to-many relationship between movies and people
+    movies: Mapped[List["Movie"]] = relationship("Movie", secondary="movie_people", back_populates="people")
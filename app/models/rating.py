@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import ForeignKey, DateTime
+from sqlalchemy import ForeignKey, DateTime, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy.sql import func
 
@@ -9,11 +9,17 @@ class MovieRating(Base):
     """Rating model"""
 
     __tablename__ = "movie_ratings"
+    #range-partitioned by month on created_at (partitions are managed by app.db.partitions),
+    #so created_at has to be part of the primary key
+    __table_args__ = (
+        Index("ix_movie_ratings_movie_id_created_at", "movie_id", "created_at"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
 
-    id: Mapped[int] = mapped_column(primary_key=True)
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     movie_id: Mapped[int] = mapped_column(ForeignKey("movies.id", ondelete="CASCADE"), nullable=False)
     score: Mapped[int] = mapped_column(nullable=False) #Should be between 1 and 10
-    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), primary_key=True, server_default=func.now())
 
     #one-to-many relationship between movies and ratings
     movie: Mapped["Movie"] = relationship("Movie", back_populates="ratings")
@@ -0,0 +1,212 @@
+"""Opt-in per-request profiling.
+
+A request is profiled when it carries `X-Profile: <PROFILE_TOKEN>` or is picked by
+PROFILE_SAMPLE_RATE. While it runs, a sampler thread snapshots the Python stack of every busy
+thread every PROFILE_INTERVAL_MS, and the SQL statements it executes are timed. Two files are
+written to PROFILE_DIR, named after the start time and the id returned in the `X-Profile-Id` header:
+
+    <time>-<id>.folded   collapsed stacks ("frame;frame;frame count"), the input format of
+                         flamegraph.pl, speedscope and inferno
+    <time>-<id>.json     request, duration, sample counts and every SQL statement with its timing
+
+Sync endpoints run on the thread pool, so a request's work is spread over the event loop
+thread and worker threads. Threads that ran this request's SQL (and the event loop thread) are
+rooted under `request` in the folded stacks; other busy threads, i.e. concurrent requests, are
+kept under `other` so they can be told apart. Idle threads are left out.
+
+Nothing is registered when neither PROFILE_TOKEN nor PROFILE_SAMPLE_RATE is set, so the mode
+costs nothing when it is off.
+"""
+import contextvars
+import hmac
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from fastapi import Request
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+# profiles recorded at once per worker; requests beyond that run unprofiled
+PROFILE_MAX_CONCURRENT = int(os.getenv("PROFILE_MAX_CONCURRENT", "2"))
+
+PROFILING_ENABLED = bool(PROFILE_TOKEN) or PROFILE_SAMPLE_RATE > 0
+
+PROFILE_HEADER = "x-profile"
+MAX_STACK_DEPTH = 128
+# leaf frames of threads that are blocked waiting for work, not doing any
+IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("selectors.py", "select"),
+    ("queue.py", "get"),
+}
+
+logger = logging.getLogger("movie_rating")
+
+_current: contextvars.ContextVar[Optional["RequestProfile"]] = contextvars.ContextVar("request_profile", default=None)
+_active = threading.BoundedSemaphore(PROFILE_MAX_CONCURRENT)
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_qualname}"
+
+
+class RequestProfile:
+    def __init__(self, method: str, path: str, interval: float = PROFILE_INTERVAL_MS / 1000):
+        self.id = uuid.uuid4().hex
+        self.method = method
+        self.path = path
+        self.interval = interval
+        self.started_at = datetime.now(timezone.utc)
+        self._started = time.perf_counter()
+        self.duration = 0.0
+        # threads known to work for this request; the event loop thread is the one that creates it
+        self.threads = {threading.get_ident()}
+        self.samples: Counter = Counter()
+        self.sample_ticks = 0
+        self.sql: List[Dict] = []
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(target=self.__sample, name=f"profiler-{self.id[:8]}", daemon=True)
+
+
+    def start(self) -> None:
+        self._sampler.start()
+
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._sampler.join()
+        self.duration = time.perf_counter() - self._started
+
+
+    def __sample(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            self.sample_ticks += 1
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                code = frame.f_code
+                if (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                self.samples[(thread_id, tuple(reversed(stack)))] += 1
+
+
+    def folded(self) -> str:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        lines = Counter()
+        for (thread_id, stack), count in self.samples.items():
+            root = "request" if thread_id in self.threads else "other"
+            thread_name = names.get(thread_id, str(thread_id)).replace(" ", "_").replace(";", "_")
+            lines[";".join((root, thread_name) + stack)] += count
+        return "".join(f"{line} {count}\n" for line, count in lines.most_common())
+
+
+    def summary(self, status_code: int) -> dict:
+        request_samples = sum(count for (thread_id, _), count in self.samples.items() if thread_id in self.threads)
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "status_code": status_code,
+            "started_at": self.started_at.isoformat(),
+            "duration_ms": round(self.duration * 1000, 3),
+            "sample_interval_ms": self.interval * 1000,
+            "sample_ticks": self.sample_ticks,
+            "request_samples": request_samples,
+            "other_samples": sum(self.samples.values()) - request_samples,
+            "sql": {
+                "count": len(self.sql),
+                "total_ms": round(sum(s["duration_ms"] for s in self.sql), 3),
+                "statements": self.sql,
+            },
+        }
+
+
+    def save(self, directory: str, status_code: int) -> None:
+        os.makedirs(directory, exist_ok=True)
+        name = f"{self.started_at.strftime('%Y%m%dT%H%M%S')}-{self.id}"
+        with open(os.path.join(directory, f"{name}.folded"), "w") as f:
+            f.write(self.folded())
+        with open(os.path.join(directory, f"{name}.json"), "w") as f:
+            json.dump(self.summary(status_code), f, indent=2)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _current.get()
+    if profile is not None:
+        profile.threads.add(threading.get_ident())
+        conn.info.setdefault("profile_query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _current.get()
+    if profile is not None and conn.info.get("profile_query_start"):
+        started = conn.info["profile_query_start"].pop()
+        profile.sql.append({
+            "statement": statement,
+            "offset_ms": round((started - profile._started) * 1000, 3),
+            "duration_ms": round((time.perf_counter() - started) * 1000, 3),
+            "rows": cursor.rowcount,
+        })
+
+
+def install_sql_timing(engine: Engine) -> None:
+    """Time the SQL of profiled requests; the context variable reaches the worker threads with the request."""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def _wants_profile(request: Request) -> bool:
+    token = request.headers.get(PROFILE_HEADER)
+    # compared as bytes, compare_digest rejects str with non-ASCII characters; headers are
+    # decoded as latin-1, so encoding back gives the bytes the client sent
+    if token is not None and PROFILE_TOKEN and hmac.compare_digest(token.encode("latin-1"), PROFILE_TOKEN.encode()):
+        return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+async def profile_requests(request: Request, call_next):
+    if not _wants_profile(request) or not _active.acquire(blocking=False):
+        return await call_next(request)
+
+    profile = RequestProfile(request.method, request.url.path)
+    token = _current.set(profile)
+    status_code = 500
+    profile.start()
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        response.headers["X-Profile-Id"] = profile.id
+        return response
+    finally:
+        profile.stop()
+        _current.reset(token)
+        _active.release()
+        try:
+            await run_in_threadpool(profile.save, PROFILE_DIR, status_code)
+            logger.info(
+                f"Request profiled - id={profile.id}, path={profile.path}, duration_ms={profile.duration * 1000:.1f}, "
+                f"sql_count={len(profile.sql)}, sql_ms={sum(s['duration_ms'] for s in profile.sql):.1f}"
+            )
+        except Exception as e:
+            logger.error(f"Saving profile {profile.id} failed: {str(e)}", exc_info=True)
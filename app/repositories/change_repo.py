@@ -0,0 +1,56 @@
+from typing import Optional, List, Protocol
+from sqlalchemy import BigInteger, Text, func, literal, tuple_
+from sqlalchemy.orm import Session
+
+from app.models import ChangeEvent
+
+
+class ChangeRepository(Protocol):
+    def record(self, entity: str, op: str, entity_id: int, movie_id: int, payload: Optional[dict] = None) -> None:
+        ...
+    def get_since(self, tx_id: int, event_id: int, limit: int) -> List[ChangeEvent]:
+        ...
+    def get_last(self) -> Optional[ChangeEvent]:
+        ...
+
+
+class SqlAlchemyChangeRepository(ChangeRepository):
+    def __init__(self, db: Session):
+        self.db = db
+
+
+    def record(self, entity: str, op: str, entity_id: int, movie_id: int, payload: Optional[dict] = None) -> None:
+        # same session, so the event commits or rolls back together with the change it describes
+        self.db.add(ChangeEvent(entity=entity, op=op, entity_id=entity_id, movie_id=movie_id, payload=payload))
+
+
+    def get_since(self, tx_id: int, event_id: int, limit: int) -> List[ChangeEvent]:
+        """Events after the (tx_id, event_id) cursor, in cursor order.
+
+        Only transactions older than our snapshot's xmin are read: they are all finished, so no
+        event can show up later behind a cursor that was already handed out.
+        """
+        return (
+            self.db.query(ChangeEvent)
+            .filter(
+                ChangeEvent.tx_id < self.__visible_xmin(),
+                tuple_(ChangeEvent.tx_id, ChangeEvent.id) > tuple_(literal(tx_id, BigInteger), literal(event_id, BigInteger)),
+            )
+            .order_by(ChangeEvent.tx_id, ChangeEvent.id)
+            .limit(limit)
+            .all()
+        )
+
+
+    def get_last(self) -> Optional[ChangeEvent]:
+        """Newest event a reader can see, i.e. the head of the feed."""
+        return (
+            self.db.query(ChangeEvent)
+            .filter(ChangeEvent.tx_id < self.__visible_xmin())
+            .order_by(ChangeEvent.tx_id.desc(), ChangeEvent.id.desc())
+            .first()
+        )
+
+
+    def __visible_xmin(self):
+        return func.pg_snapshot_xmin(func.pg_current_snapshot()).cast(Text).cast(BigInteger)
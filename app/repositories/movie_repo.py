@@ -1,10 +1,30 @@
+from datetime import datetime
 from typing import Optional
-from sqlalchemy.orm import Session, selectinload
-from sqlalchemy import func
-from typing import Optional, Tuple, List, Protocol
+from sqlalchemy.orm import Session, selectinload, joinedload
+from sqlalchemy import func, delete, select, insert, inspect
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm.exc import StaleDataError
+from typing import Optional, Tuple, List, Dict, Protocol
 
-from app.models import Movie, MovieRating, Genre, Director
-from app.exceptions.errors import NotFoundError
+from app.models import Movie, MovieRating, Genre, Director, Person
+from app.models.movie import movie_genres, movie_people
+from app.db.session import run_after_commit
+from app.exceptions.errors import NotFoundError, PreconditionFailedError
+
+
+def normalize_person_name(name: str) -> str:
+    """Lookup key of a cast member: whitespace collapsed and lower-cased (mirrored in SQL by the people migration)."""
+    return " ".join(name.split()).lower()[:255]
+
+
+def parse_cast(cast: Optional[str]) -> List[Tuple[str, str]]:
+    """Split a comma separated cast string into unique (name, normalized_name) pairs, in billing order."""
+    people = {}
+    for part in (cast or "").split(","):
+        name = " ".join(part.split())[:255]
+        if name:
+            people.setdefault(normalize_person_name(name), name)
+    return [(name, normalized) for normalized, name in people.items()]
 
 
 class MovieRepository(Protocol):
@@ -20,20 +40,40 @@ class MovieRepository(Protocol):
         ...
     def get_all(self, page: int = 1, page_size: int = 10) -> Tuple[int, List[Movie]]:
         ...
-    def get_filtered(self, page: int = 1, page_size: int = 10, title: Optional[str] = None, release_year: Optional[int] = None, genre: Optional[str] = None) -> Tuple[int, List[Movie]]:
+    def get_filtered(self, page: int = 1, page_size: int = 10, title: Optional[str] = None, release_year: Optional[int] = None, genre: Optional[str] = None, cast: Optional[str] = None) -> Tuple[int, List[Movie]]:
+        ...
+    def get_by_person(self, name: str, page: int = 1, page_size: int = 10) -> Tuple[int, List[Movie]]:
         ...
     def get_by_id(self, movie_id: int) -> Optional[Movie]:
         ...
+    def get_many_by_ids(self, movie_ids: List[int]) -> Dict[int, Movie]:
+        ...
+    def get_for_update(self, movie_id: int) -> Optional[Movie]:
+        ...
     def create(self, title: str, director_id: int, release_year: int, cast: Optional[str]) -> Movie:
         ...
     def add_genres(self, movie: Movie, genre_ids: List[int]) -> None:
         ...
-    def delete(self, movie_id: int) -> None:
+    def delete(self, movie_id: int) -> bool:
+        ...
+    def delete_many(self, movie_ids: Optional[List[int]] = None, title: Optional[str] = None, release_year: Optional[int] = None, genre: Optional[str] = None) -> List[int]:
         ...
     def update(self, movie_id: int, title: str, director_id: int, release_year: int, cast: Optional[str]) -> Movie:
         ...
+    def patch(self, movie: Movie, fields: dict, added_genres: List[Genre], removed_genres: List[Genre]) -> Movie:
+        ...
     def create_rating(self, movie_id: int, score: int) -> MovieRating:
         ...
+    def exists(self, movie_id: int) -> bool:
+        ...
+    def get_similarity_features(self) -> Tuple[List[Tuple[int, int, int]], List[Tuple[int, int]], List[Tuple[int, int, int]]]:
+        ...
+    def get_rating_trend(self, movie_id: int, bucket: str, since: datetime, until: datetime) -> List[Tuple[datetime, int, Optional[float]]]:
+        ...
+    def get_title_rows(self) -> List[Tuple[int, str, int]]:
+        ...
+    def after_commit(self, callback) -> None:
+        ...
 
 
 class SqlAlchemyMovieRepository(MovieRepository):
@@ -51,16 +91,43 @@ class SqlAlchemyMovieRepository(MovieRepository):
         return average_rating
 
 
-    def __get_paginated(self, page: int = 1, page_size: int = 10, title: Optional[str] = None, release_year: Optional[int] = None, genre: Optional[str] = None) -> Tuple[int, List[Movie]]:
-        query = self.db.query(Movie).options(selectinload(Movie.genres))
+    def __get_ratings_stats(self, movie_ids: List[int]) -> Dict[int, Tuple[int, Optional[float]]]:
+        # one grouped query for the whole set instead of count + avg per movie
+        rows = (
+            self.db.query(MovieRating.movie_id, func.count(MovieRating.id), func.avg(MovieRating.score))
+            .filter(MovieRating.movie_id.in_(movie_ids))
+            .group_by(MovieRating.movie_id)
+            .all()
+        )
+        return {movie_id: (count, avg) for movie_id, count, avg in rows}
+
+
+    def __person_movie_ids(self, name: str):
+        # people.normalized_name (unique index) -> movie_people.person_id (index)
+        return (
+            select(movie_people.c.movie_id)
+            .join(Person, Person.id == movie_people.c.person_id)
+            .where(Person.normalized_name == normalize_person_name(name))
+        )
 
+
+    def __filter_criteria(self, title: Optional[str] = None, release_year: Optional[int] = None, genre: Optional[str] = None, cast: Optional[str] = None) -> list:
+        criteria = []
         if title:
-            query = query.filter(Movie.title.ilike(f"%{title}%"))
+            criteria.append(Movie.title.ilike(f"%{title}%"))
         if release_year:
-            query = query.filter(Movie.release_year == release_year)
+            criteria.append(Movie.release_year == release_year)
         if genre:
             # safest approach — uses EXISTS under the hood, no duplicate join
-            query = query.filter(Movie.genres.any(Genre.name == genre))
+            criteria.append(Movie.genres.any(Genre.name == genre))
+        if cast:
+            criteria.append(Movie.id.in_(self.__person_movie_ids(cast)))
+        return criteria
+
+
+    def __get_paginated(self, page: int = 1, page_size: int = 10, title: Optional[str] = None, release_year: Optional[int] = None, genre: Optional[str] = None, cast: Optional[str] = None) -> Tuple[int, List[Movie]]:
+        query = self.db.query(Movie).options(selectinload(Movie.genres))
+        query = query.filter(*self.__filter_criteria(title, release_year, genre, cast))
 
         # total: if you had joins that could produce duplicates, use distinct:
         total = query.distinct().count()
@@ -82,8 +149,32 @@ class SqlAlchemyMovieRepository(MovieRepository):
         return self.db.query(Genre).filter(Genre.id.in_(genres)).all()
 
 
-    def get_filtered(self, page: int = 1, page_size: int = 10, title: Optional[str] = None, release_year: Optional[int] = None, genre: Optional[str] = None) -> Tuple[int, List[Movie]]:
-        return self.__get_paginated(page, page_size, title, release_year, genre)
+    def get_filtered(self, page: int = 1, page_size: int = 10, title: Optional[str] = None, release_year: Optional[int] = None, genre: Optional[str] = None, cast: Optional[str] = None) -> Tuple[int, List[Movie]]:
+        return self.__get_paginated(page, page_size, title, release_year, genre, cast)
+
+
+    def get_by_person(self, name: str, page: int = 1, page_size: int = 10) -> Tuple[int, List[Movie]]:
+        # only the person's movies are touched: cost follows the result set, not the catalog
+        query = (
+            self.db.query(Movie)
+            .join(movie_people, movie_people.c.movie_id == Movie.id)
+            .join(Person, Person.id == movie_people.c.person_id)
+            .filter(Person.normalized_name == normalize_person_name(name))
+        )
+        total = query.count()
+        items = (
+            query.options(joinedload(Movie.director), selectinload(Movie.genres))
+            .order_by(Movie.release_year.desc(), Movie.id)
+            .offset((page - 1) * page_size)
+            .limit(page_size)
+            .all()
+        )
+        stats = self.__get_ratings_stats([m.id for m in items]) if items else {}
+        for m in items:
+            count, avg = stats.get(m.id, (0, None))
+            m.ratings_count = count
+            m.average_rating = round(avg, 2) if avg is not None else None
+        return total, items
 
 
     def get_by_id(self, movie_id: int) -> Optional[Movie]:
@@ -96,13 +187,66 @@ class SqlAlchemyMovieRepository(MovieRepository):
         return fully_detailed_movie
 
 
+    def get_many_by_ids(self, movie_ids: List[int]) -> Dict[int, Movie]:
+        if not movie_ids:
+            return {}
+        movies = (
+            self.db.query(Movie)
+            .options(joinedload(Movie.director), joinedload(Movie.genres))
+            .filter(Movie.id.in_(movie_ids))
+            .all()
+        )
+        stats = self.__get_ratings_stats([m.id for m in movies]) if movies else {}
+        for m in movies:
+            count, avg = stats.get(m.id, (0, None))
+            m.ratings_count = count
+            m.average_rating = round(avg, 2) if avg is not None else None
+        return {m.id: m for m in movies} #keyed by id, so the caller can restore request order
+
+
+    def get_for_update(self, movie_id: int) -> Optional[Movie]:
+        # single statement: the movie with its director and genres, no rating aggregates
+        return (
+            self.db.query(Movie)
+            .options(joinedload(Movie.director), joinedload(Movie.genres))
+            .filter(Movie.id == movie_id)
+            .one_or_none()
+        )
+
+
     def create(self, title: str, director_id: int, release_year: int, cast: Optional[str]) -> Movie:
         movie = Movie(title=title, director_id=director_id, release_year=release_year, cast=cast)
         self.db.add(movie)
         self.db.flush()
+        self.__sync_people(movie.id, cast)
         return movie
 
 
+    def __sync_people(self, movie_id: int, cast: Optional[str]) -> None:
+        """Rewrite the movie_people links of a movie from its cast string, creating unknown people."""
+        people = parse_cast(cast)
+        self.db.execute(delete(movie_people).where(movie_people.c.movie_id == movie_id))
+        if not people:
+            return
+        self.db.execute(
+            pg_insert(Person)
+            .values([{"name": name, "normalized_name": normalized} for name, normalized in people])
+            .on_conflict_do_nothing(index_elements=[Person.normalized_name])
+        )
+        person_ids = dict(
+            self.db.execute(
+                select(Person.normalized_name, Person.id).where(Person.normalized_name.in_([n for _, n in people]))
+            ).all()
+        )
+        self.db.execute(
+            insert(movie_people),
+            [
+                {"movie_id": movie_id, "person_id": person_ids[normalized], "position": position}
+                for position, (_, normalized) in enumerate(people, start=1)
+            ],
+        )
+
+
     def add_genres(self, movie: Movie, genre_ids: List[int]) -> None:
         genres = self.db.query(Genre).filter(Genre.id.in_(genre_ids)).all()
         movie.genres = genres
@@ -114,16 +258,104 @@ class SqlAlchemyMovieRepository(MovieRepository):
         self.db.flush()
         return rating
 
-    def delete(self, movie: Movie) -> None:
-        self.db.delete(movie)
-        self.db.flush()
-        return 
-        
+    def exists(self, movie_id: int) -> bool:
+        return self.db.query(Movie.id).filter(Movie.id == movie_id).first() is not None
+
+
+    def get_similarity_features(self) -> Tuple[List[Tuple[int, int, int]], List[Tuple[int, int]], List[Tuple[int, int, int]]]:
+        """Raw inputs of the similar-movies index: movies, genre links and per-score rating counts."""
+        movies = self.db.query(Movie.id, Movie.director_id, Movie.release_year).all()
+        genre_links = self.db.query(movie_genres.c.movie_id, movie_genres.c.genre_id).all()
+        score_counts = (
+            self.db.query(MovieRating.movie_id, MovieRating.score, func.count(MovieRating.id))
+            .group_by(MovieRating.movie_id, MovieRating.score)
+            .all()
+        )
+        return movies, genre_links, score_counts
+
+
+    def get_title_rows(self) -> List[Tuple[int, str, int]]:
+        """(id, title, ratings count) of every movie, the input of the title autocomplete index."""
+        counts = (
+            select(MovieRating.movie_id, func.count().label("ratings_count"))
+            .group_by(MovieRating.movie_id)
+            .subquery()
+        )
+        return (
+            self.db.query(Movie.id, Movie.title, func.coalesce(counts.c.ratings_count, 0))
+            .outerjoin(counts, counts.c.movie_id == Movie.id)
+            .all()
+        )
+
+
+    def after_commit(self, callback) -> None:
+        run_after_commit(self.db, callback)
+
+
+    def get_rating_trend(self, movie_id: int, bucket: str, since: datetime, until: datetime) -> List[Tuple[datetime, int, Optional[float]]]:
+        # the created_at range lets postgres prune the monthly partitions outside the window
+        bucket_start = func.date_trunc(bucket, func.timezone("UTC", MovieRating.created_at)).label("bucket_start")
+        return (
+            self.db.query(bucket_start, func.count(MovieRating.id), func.avg(MovieRating.score))
+            .filter(
+                MovieRating.movie_id == movie_id,
+                MovieRating.created_at >= since,
+                MovieRating.created_at < until,
+            )
+            .group_by(bucket_start)
+            .order_by(bucket_start)
+            .all()
+        )
+
+
+    def delete(self, movie_id: int) -> bool:
+        # single DELETE; ratings and genre links go with it through ON DELETE CASCADE
+        result = self.db.execute(
+            delete(Movie).where(Movie.id == movie_id).execution_options(synchronize_session=False)
+        )
+        return result.rowcount > 0
+
+
+    def delete_many(self, movie_ids: Optional[List[int]] = None, title: Optional[str] = None, release_year: Optional[int] = None, genre: Optional[str] = None) -> List[int]:
+        criteria = self.__filter_criteria(title, release_year, genre)
+        if movie_ids is not None:
+            criteria.append(Movie.id.in_(movie_ids))
+        result = self.db.execute(
+            delete(Movie).where(*criteria).returning(Movie.id).execution_options(synchronize_session=False)
+        )
+        return list(result.scalars())
+
+
     def update(self, updated_movie: Movie) -> Movie:
         orm_movie = self.db.query(Movie).filter(Movie.id == updated_movie.id).one_or_none()
         orm_movie.title = updated_movie.title
         orm_movie.release_year = updated_movie.release_year
         orm_movie.genres = updated_movie.genres
         orm_movie.cast = updated_movie.cast
-        self.db.commit()
-        return orm_movie
\ No newline at end of file
+        cast_changed = inspect(orm_movie).attrs.cast.history.has_changes()
+        orm_movie.version = orm_movie.version + 1
+        self.__flush_versioned()
+        if cast_changed:
+            self.__sync_people(orm_movie.id, orm_movie.cast)
+        return orm_movie
+
+
+    def patch(self, movie: Movie, fields: dict, added_genres: List[Genre], removed_genres: List[Genre]) -> Movie:
+        for key, value in fields.items():
+            setattr(movie, key, value)
+        # only the changed links are written to movie_genres
+        for genre in removed_genres:
+            movie.genres.remove(genre)
+        movie.genres.extend(added_genres)
+        movie.version = movie.version + 1
+        self.__flush_versioned()
+        if "cast" in fields:
+            self.__sync_people(movie.id, movie.cast)
+        return movie
+
+
+    def __flush_versioned(self) -> None:
+        try:
+            self.db.flush()
+        except StaleDataError:
+            raise PreconditionFailedError("Movie was modified by another request")
\ No newline at end of file
@@ -0,0 +1,20 @@
+from pydantic import BaseModel
+from datetime import datetime
+from typing import List, Optional
+
+
+class ChangeEventOut(BaseModel):
+    cursor: str
+    entity: str
+    op: str
+    entity_id: int
+    movie_id: int
+    payload: Optional[dict] = None
+    created_at: datetime
+
+
+class ChangeFeedOut(BaseModel):
+    status: str
+    next_cursor: str
+    has_more: bool
+    data: List[ChangeEventOut]
@@ -1,5 +1,6 @@
+from datetime import datetime
 from pydantic import BaseModel, Field, field_validator
-from typing import List, Optional, Any
+from typing import List, Optional, Any, Literal
 
 
 class DirectorSummaryOut(BaseModel):
@@ -54,15 +55,14 @@ class MovieSummaryOut(BaseModel):
         return []
 
 
-class MovieFullInfoOut(BaseModel):
+class MovieDetailsBase(BaseModel):
+    """Fields shared by the full movie responses."""
     id: int
     title: str
     release_year: int = None
     director: DirectorFullInfoOut = None
     genres: List[str] = []
-    cast: str
-    average_rating: Optional[float] = None
-    ratings_count: int = 0
+    cast: Optional[str] = None
 
     model_config = {"from_attributes": True}
 
@@ -81,6 +81,17 @@ class MovieFullInfoOut(BaseModel):
         return []
 
 
+class MovieFullInfoOut(MovieDetailsBase):
+    average_rating: Optional[float] = None
+    ratings_count: int = 0
+    version: int = 1
+
+
+class MovieUpdatedOut(MovieDetailsBase):
+    """Movie details returned after a partial update (rating aggregates are not reloaded)."""
+    version: int
+
+
 class MovieListItem(BaseModel):
     status: str
     page: int
@@ -94,6 +105,60 @@ class MovieSingleItem(BaseModel):
     data: List[MovieFullInfoOut]
 
 
+class MovieUpdatedItem(BaseModel):
+    status: str
+    data: List[MovieUpdatedOut]
+
+
+class MovieBatchEntry(BaseModel):
+    id: int
+    found: bool
+    data: Optional[MovieFullInfoOut] = None
+
+
+class MovieBatchItem(BaseModel):
+    status: str
+    data: List[MovieBatchEntry]
+
+
+class RatingTrendBucket(BaseModel):
+    bucket_start: datetime
+    ratings_count: int
+    average_rating: Optional[float] = None
+
+
+class RatingTrendOut(BaseModel):
+    status: str
+    movie_id: int
+    bucket: Literal["day", "week", "month"]
+    since: datetime
+    until: datetime
+    data: List[RatingTrendBucket]
+
+
+class SimilarMovieOut(BaseModel):
+    movie_id: int
+    score: float
+
+
+class SimilarMoviesOut(BaseModel):
+    status: str
+    movie_id: int
+    data: List[SimilarMovieOut]
+
+
+class TitleSuggestionOut(BaseModel):
+    id: int
+    title: str
+    ratings_count: int
+
+
+class TitleSuggestionsOut(BaseModel):
+    status: str
+    query: str
+    data: List[TitleSuggestionOut]
+
+
 class MovieCreate(BaseModel):
     title: str
     director_id: int
@@ -102,6 +167,23 @@ class MovieCreate(BaseModel):
     genres: List[int] = []
 
 
+class MoviePatch(BaseModel):
+    """Partial update payload; fields left out of the request body are not changed."""
+    title: Optional[str] = None
+    director_id: Optional[int] = None
+    release_year: Optional[int] = Field(None, ge=1850, le=2026, description="Release year must be between 1850 and current year=2026")
+    cast: Optional[str] = None
+    genres: Optional[List[int]] = None
+
+
+class MovieBulkDelete(BaseModel):
+    """Selects the movies to delete: explicit ids, list filters, or both (combined with AND)."""
+    ids: Optional[List[int]] = None
+    title: Optional[str] = None
+    release_year: Optional[int] = None
+    genre: Optional[str] = None
+
+
 class RatingCreate(BaseModel):
     score: int = Field(..., ge=1, le=10)
 
@@ -0,0 +1,99 @@
+"""Builds or refreshes the similar-movies index used by GET /api/v1/movies/{id}/similar.
+
+    python -m app.scripts.build_similar_index                 # full rebuild
+    python -m app.scripts.build_similar_index --changes       # movies changed since the current build, from the change feed
+    python -m app.scripts.build_similar_index --refresh 12 40  # only movies 12 and 40 changed
+
+`app.server` runs the --changes refresh every SIMILAR_INDEX_REFRESH_SECONDS.
+"""
+import argparse
+import logging
+import time
+from typing import List, Optional
+
+import numpy as np
+
+from app.db.session import SessionLocal
+from app.repositories.change_repo import SqlAlchemyChangeRepository
+from app.repositories.movie_repo import SqlAlchemyMovieRepository
+from app.services.change_service import ChangeService, MAX_CHANGES_PAGE
+from app.services.similar_index import (
+    SIMILAR_INDEX_DIR, SIMILAR_INDEX_TOP_K, SimilarMoviesIndex, build_features, build_index, refresh_index, save_index,
+)
+
+logger = logging.getLogger("movie_rating")
+
+
+def build_similar_index(
+        changed_ids: Optional[List[int]] = None,
+        directory: str = SIMILAR_INDEX_DIR,
+        cursor: Optional[str] = None,
+) -> str:
+    """Rebuild the index, or refresh the published one when `changed_ids` is given; returns the new build name.
+
+    `cursor` is the change feed position the catalog is read after; without one a full build
+    starts from the head of the feed and a refresh keeps the cursor of the build it refreshes.
+    """
+    started = time.perf_counter()
+    current = SimilarMoviesIndex(directory)
+    refreshing = changed_ids is not None and current.load() and current.neighbours.shape[1] == SIMILAR_INDEX_TOP_K
+    with SessionLocal() as session:
+        if cursor is None:
+            # taken before the catalog is read, so a change in between is picked up again, not lost
+            cursor = current.cursor if refreshing else ChangeService(SqlAlchemyChangeRepository(session)).get_head_cursor()
+        movies, genre_links, score_counts = SqlAlchemyMovieRepository(session).get_similarity_features()
+    features = build_features(movies, genre_links, score_counts)
+
+    if refreshing:
+        neighbours, scores = refresh_index(features, np.asarray(current.ids), current.neighbours, current.scores, changed_ids)
+        mode = f"refreshed {len(changed_ids)} changed movie(s)"
+    else:
+        neighbours, scores = build_index(features, SIMILAR_INDEX_TOP_K)
+        mode = "full build"
+
+    build = save_index(directory, features.ids, neighbours, scores, cursor)
+    logger.info(
+        f"Similar movies index {build} written - {mode}, movies={len(features.ids)}, "
+        f"k={SIMILAR_INDEX_TOP_K}, cursor={cursor}, took={time.perf_counter() - started:.2f}s"
+    )
+    return build
+
+
+def refresh_similar_index(directory: str = SIMILAR_INDEX_DIR) -> Optional[str]:
+    """Refresh the index with the movies the change feed reports since its build; None when nothing changed.
+
+    Builds from scratch when there is no index yet or the current build has no cursor.
+    """
+    current = SimilarMoviesIndex(directory)
+    if not current.load() or current.cursor is None:
+        return build_similar_index(directory=directory)
+
+    changed, cursor = set(), current.cursor
+    with SessionLocal() as session:
+        change_service = ChangeService(SqlAlchemyChangeRepository(session))
+        while True:
+            page = change_service.get_changes(cursor, MAX_CHANGES_PAGE)
+            # rating events change the rating profile of their movie, so every event counts
+            changed.update(item["movie_id"] for item in page["items"])
+            cursor = page["next_cursor"]
+            if not page["has_more"]:
+                break
+    if not changed:
+        return None
+    return build_similar_index(sorted(changed), directory, cursor)
+
+
+if __name__ == "__main__":
+    from app.logging_config import setup_logging
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--changes", action="store_true", help="refresh the movies changed since the current build")
+    mode.add_argument("--refresh", nargs="+", type=int, metavar="MOVIE_ID", help="ids of created, updated or deleted movies")
+    args = parser.parse_args()
+
+    setup_logging()
+    if args.changes:
+        refresh_similar_index()
+    else:
+        build_similar_index(args.refresh)
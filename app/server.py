@@ -0,0 +1,134 @@
+"""Production entry point.
+
+Runs the Alembic migrations and the rating partition maintenance once in the parent
+process, then starts uvicorn with a pre-forked pool of workers sharing the listening
+socket. Each worker warms up in the application lifespan (see `app.main.warm_up`)
+before it starts accepting connections, and on SIGTERM stops accepting new ones and
+drains in-flight requests for up to GRACEFUL_TIMEOUT seconds.
+
+While the workers run, the parent repeats the rating partition maintenance every
+RATINGS_PARTITION_MAINTENANCE_SECONDS and refreshes the similar movies index from the change
+feed every SIMILAR_INDEX_REFRESH_SECONDS; workers pick up each new build on their own.
+
+Usage:
+    python -m app.server
+"""
+import logging
+import os
+import threading
+from pathlib import Path
+
+import uvicorn
+from alembic import command
+from alembic.config import Config
+from dotenv import load_dotenv
+
+from app.db.partitions import maintain_rating_partitions
+from app.db.session import engine
+from app.logging_config import setup_logging
+from app.scripts.build_similar_index import build_similar_index, refresh_similar_index
+from app.services.similar_index import similar_index
+
+load_dotenv()
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+
+def _available_cpus() -> int:
+    # respect CPU affinity / cgroup pinning where the platform exposes it
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = int(os.getenv("PORT", "8000"))
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "0")) or _available_cpus()
+GRACEFUL_TIMEOUT = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+KEEP_ALIVE = int(os.getenv("KEEP_ALIVE", "5"))
+BACKLOG = int(os.getenv("BACKLOG", "2048"))
+MAX_REQUESTS = int(os.getenv("MAX_REQUESTS", "0")) or None
+RUN_MIGRATIONS = os.getenv("RUN_MIGRATIONS", "true").lower() == "true"
+RUN_PARTITION_MAINTENANCE = os.getenv("RUN_PARTITION_MAINTENANCE", "true").lower() == "true"
+RATINGS_PARTITION_MAINTENANCE_SECONDS = float(os.getenv("RATINGS_PARTITION_MAINTENANCE_SECONDS", "86400"))
+SIMILAR_INDEX_BUILD_ON_START = os.getenv("SIMILAR_INDEX_BUILD_ON_START", "true").lower() == "true"
+SIMILAR_INDEX_REFRESH_SECONDS = float(os.getenv("SIMILAR_INDEX_REFRESH_SECONDS", "300"))
+LOG_LEVEL = os.getenv("LOG_LEVEL", "info")
+
+logger = logging.getLogger("movie_rating")
+
+# set when uvicorn returns, ends the launcher's periodic jobs
+stop_jobs = threading.Event()
+
+
+def run_migrations():
+    config = Config(str(PROJECT_ROOT / "alembic.ini"))
+    config.set_main_option("script_location", str(PROJECT_ROOT / "alembic"))
+    command.upgrade(config, "head")
+
+
+def run_periodically(name: str, interval: float, job) -> None:
+    """Run `job` every `interval` seconds on a daemon thread of the launcher; failures are logged and retried."""
+    if interval <= 0:
+        return
+
+    def loop():
+        while not stop_jobs.wait(interval):
+            try:
+                job()
+            except Exception as e:
+                logger.error(f"Scheduled {name} failed: {str(e)}", exc_info=True)
+
+    threading.Thread(target=loop, name=name, daemon=True).start()
+
+
+def main():
+    setup_logging()
+
+    if RUN_MIGRATIONS:
+        logger.info("Applying database migrations")
+        run_migrations()
+        # alembic's fileConfig replaces the logging setup, restore ours
+        setup_logging()
+
+    if RUN_PARTITION_MAINTENANCE:
+        try:
+            maintain_rating_partitions()
+        except Exception as e:
+            # ratings still land in the default partition, so this must not keep the server down
+            logger.error(f"Rating partition maintenance failed: {str(e)}", exc_info=True)
+        finally:
+            engine.dispose()
+
+    if SIMILAR_INDEX_BUILD_ON_START and not similar_index.load():
+        try:
+            build_similar_index()
+        except Exception as e:
+            # /similar answers 503 until the index is built offline
+            logger.error(f"Building the similar movies index failed: {str(e)}", exc_info=True)
+        finally:
+            engine.dispose()
+
+    # workers are spawned, not forked, so the launcher's connections are never shared with them
+    if RUN_PARTITION_MAINTENANCE:
+        run_periodically("rating-partition-maintenance", RATINGS_PARTITION_MAINTENANCE_SECONDS, maintain_rating_partitions)
+    run_periodically("similar-index-refresh", SIMILAR_INDEX_REFRESH_SECONDS, refresh_similar_index)
+
+    logger.info(f"Starting server on {HOST}:{PORT} with {WEB_CONCURRENCY} worker(s)")
+    uvicorn.run(
+        "app.main:app",
+        host=HOST,
+        port=PORT,
+        workers=WEB_CONCURRENCY,
+        timeout_graceful_shutdown=GRACEFUL_TIMEOUT,
+        timeout_keep_alive=KEEP_ALIVE,
+        backlog=BACKLOG,
+        limit_max_requests=MAX_REQUESTS,
+        log_level=LOG_LEVEL,
+        proxy_headers=True,
+    )
+    stop_jobs.set()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+from app.models import ChangeEvent
+from app.repositories.change_repo import SqlAlchemyChangeRepository
+from app.exceptions.errors import ValidationError
+
+from typing import Optional, Tuple
+
+# largest page of events a single feed request may ask for
+MAX_CHANGES_PAGE = 1000
+
+
+def format_cursor(tx_id: int, event_id: int) -> str:
+    return f"{tx_id}-{event_id}"
+
+
+def parse_cursor(cursor: Optional[str]) -> Tuple[int, int]:
+    """Cursor handed out by the feed -> (tx_id, event_id); no cursor starts from the oldest event."""
+    if not cursor:
+        return 0, 0
+    try:
+        tx_id, event_id = cursor.split("-")
+        return int(tx_id), int(event_id)
+    except ValueError:
+        raise ValidationError("Invalid cursor, pass a cursor returned by the change feed")
+
+
+def _event_out(event: ChangeEvent) -> dict:
+    return {
+        "cursor": format_cursor(event.tx_id, event.id),
+        "entity": event.entity,
+        "op": event.op,
+        "entity_id": event.entity_id,
+        "movie_id": event.movie_id,
+        "payload": event.payload,
+        "created_at": event.created_at,
+    }
+
+
+class ChangeService:
+    def __init__(self, change_repo: SqlAlchemyChangeRepository):
+        self.repo = change_repo
+
+
+    def get_changes(self, since: Optional[str] = None, limit: int = 100) -> dict:
+        """Next page of the change feed after `since`; `next_cursor` is where the following call resumes."""
+        if not 1 <= limit <= MAX_CHANGES_PAGE:
+            raise ValidationError(f"limit must be between 1 and {MAX_CHANGES_PAGE}")
+        tx_id, event_id = parse_cursor(since)
+        items = [_event_out(event) for event in self.repo.get_since(tx_id, event_id, limit)]
+        return {
+            "items": items,
+            "next_cursor": items[-1]["cursor"] if items else format_cursor(tx_id, event_id),
+            "has_more": len(items) == limit,
+        }
+
+
+    def get_head_cursor(self) -> str:
+        """Cursor after the newest visible event; reading from it returns only later changes."""
+        last = self.repo.get_last()
+        return format_cursor(last.tx_id, last.id) if last else format_cursor(0, 0)
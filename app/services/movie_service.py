@@ -1,19 +1,84 @@
+from app.db.session import write_generation
 from app.models import Movie, MovieRating
-from app.repositories.movie_repo import SqlAlchemyMovieRepository
-from app.exceptions.errors import NotFoundError, ValidationError
+from app.repositories.movie_repo import SqlAlchemyMovieRepository, normalize_person_name
+from app.repositories.change_repo import SqlAlchemyChangeRepository
+from app.schemas.movie import MovieFullInfoOut, MovieSummaryOut
+from app.services.similar_index import similar_index
+from app.services.singleflight import movie_details_flight, movie_list_flight
+from app.services.title_index import title_index, MAX_SUGGESTIONS
+from app.exceptions.errors import NotFoundError, ValidationError, PreconditionFailedError, ServiceUnavailableError
+
+from datetime import datetime, timedelta, timezone
+from typing import Optional, List, Tuple
+
+# upper bound on ids accepted by a single multi-get request
+MAX_BATCH_SIZE = 100
+
+# window covered by a rating trend when the caller gives no `since`
+TREND_DEFAULT_WINDOWS = {
+    "day": timedelta(days=30),
+    "week": timedelta(weeks=26),
+    "month": timedelta(days=365),
+}
+
+def _as_utc(value: datetime) -> datetime:
+    # naive datetimes are taken as UTC
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def _movie_payload(movie: Movie) -> dict:
+    """Movie state published in the change feed."""
+    return {
+        "title": movie.title,
+        "release_year": movie.release_year,
+        "director_id": movie.director_id,
+        "genres": [g.name for g in movie.genres],
+        "cast": movie.cast,
+        "version": movie.version,
+    }
 
-from typing import Optional
 
 class MovieService:
-    def __init__(self, movie_repo: SqlAlchemyMovieRepository):
+    def __init__(self, movie_repo: SqlAlchemyMovieRepository, change_repo: SqlAlchemyChangeRepository):
         self.repo = movie_repo
+        self.changes = change_repo
 
 
-    def filter_movies(self, page: int=1, page_size: int=10, title: Optional[str] = None, release_year: Optional[int] = None, genre: Optional[str] = None):
-        total, items = self.repo.get_filtered(page, page_size, title, release_year, genre)
+    def filter_movies(self, page: int=1, page_size: int=10, title: Optional[str] = None, release_year: Optional[int] = None, genre: Optional[str] = None, cast: Optional[str] = None):
+        total, items = self.repo.get_filtered(page, page_size, title, release_year, genre, cast)
         return {"page": page, "page_size": page_size, "total_items": total, "items": items} 
 
 
+    def filter_movies_coalesced(self, page: int=1, page_size: int=10, title: Optional[str] = None, release_year: Optional[int] = None, genre: Optional[str] = None, cast: Optional[str] = None):
+        """`filter_movies` with items as MovieSummaryOut; identical concurrent calls share one execution.
+
+        The key only merges parameters the query treats the same (title is matched case-insensitively,
+        cast by normalized name) and the write generation, so no call joins a read started before a committed write.
+        """
+        key = (
+            page,
+            page_size,
+            title.lower() if title else None,
+            release_year,
+            genre or None,
+            normalize_person_name(cast) if cast else None,
+            write_generation(),
+        )
+
+        def load():
+            res = self.filter_movies(page, page_size, title, release_year, genre, cast)
+            return {**res, "items": [MovieSummaryOut.model_validate(m) for m in res["items"]]}
+
+        return dict(movie_list_flight.do(key, load))
+
+
+    def movies_by_person(self, name: str, page: int = 1, page_size: int = 10):
+        if not name.strip():
+            raise ValidationError("Person name must not be empty")
+        total, items = self.repo.get_by_person(name, page, page_size)
+        return {"page": page, "page_size": page_size, "total_items": total, "items": items}
+
+
     def get_movie(self, movie_id: int) -> Movie:
         m = self.repo.get_by_id(movie_id)
         if not m:
@@ -21,6 +86,24 @@ class MovieService:
         return m
 
 
+    def get_movie_coalesced(self, movie_id: int) -> MovieFullInfoOut:
+        """`get_movie` as MovieFullInfoOut; identical concurrent calls share one execution (and its NotFoundError)."""
+        return movie_details_flight.do(
+            (movie_id, write_generation()),
+            lambda: MovieFullInfoOut.model_validate(self.get_movie(movie_id)),
+        )
+
+
+    def get_movies(self, movie_ids: List[int]) -> List[Optional[Movie]]:
+        """Fetch many movies at once; the result follows `movie_ids` order with None for unknown ids."""
+        if not movie_ids:
+            raise ValidationError("At least one movie id is required")
+        if len(movie_ids) > MAX_BATCH_SIZE:
+            raise ValidationError(f"At most {MAX_BATCH_SIZE} movie ids can be requested at once")
+        found = self.repo.get_many_by_ids(list(dict.fromkeys(movie_ids)))
+        return [found.get(movie_id) for movie_id in movie_ids]
+
+
     def create_movie(self, payload: dict) -> Movie:
         # validate director
         director = self.repo._get_director(payload["director_id"])
@@ -37,6 +120,8 @@ class MovieService:
         movie = self.repo.create(payload["title"], payload["director_id"], payload.get("release_year"), payload.get("cast"))
         if payload.get("genres"):
             self.repo.add_genres(movie, payload["genres"])
+        self.changes.record("movie", "create", movie.id, movie.id, _movie_payload(movie))
+        self.__index_title(movie.id, movie.title)
         return movie
 
 
@@ -47,14 +132,71 @@ class MovieService:
         if not isinstance(score, int) or score < 1 or score > 10:
             raise ValidationError("Score must be an integer between 1 and 10")
         rating = self.repo.create_rating(movie_id, score)
+        self.changes.record("rating", "create", rating.id, movie_id, {"score": rating.score, "created_at": rating.created_at.isoformat()})
+        self.repo.after_commit(lambda: title_index.add_ratings(movie_id))
         return rating
 
     
+    def get_similar(self, movie_id: int, limit: int = 10) -> List[Tuple[int, float]]:
+        # served from the precomputed index only, no database round trip
+        if not similar_index.available:
+            raise ServiceUnavailableError("Similar movies index has not been built yet")
+        similar = similar_index.lookup(movie_id, limit)
+        if similar is None:
+            raise NotFoundError("Movie not found in similar movies index")
+        return similar
+
+
+    def get_rating_trend(self, movie_id: int, bucket: str, since: Optional[datetime] = None, until: Optional[datetime] = None) -> dict:
+        if bucket not in TREND_DEFAULT_WINDOWS:
+            raise ValidationError("bucket must be one of: day, week, month")
+        until = _as_utc(until) if until else datetime.now(timezone.utc)
+        since = _as_utc(since) if since else until - TREND_DEFAULT_WINDOWS[bucket]
+        if since >= until:
+            raise ValidationError("since must be earlier than until")
+
+        if not self.repo.exists(movie_id):
+            raise NotFoundError("Movie not found")
+        rows = self.repo.get_rating_trend(movie_id, bucket, since, until)
+        items = [
+            {
+                "bucket_start": bucket_start.replace(tzinfo=timezone.utc),
+                "ratings_count": count,
+                "average_rating": round(avg, 2) if avg is not None else None,
+            }
+            for bucket_start, count, avg in rows
+        ]
+        return {"since": since, "until": until, "items": items}
+
+
+    def suggest_titles(self, query: str, limit: int = 10) -> List[Tuple[int, str, int]]:
+        """Movies with a title word starting with `query`, most rated first; answered from memory."""
+        if not 1 <= limit <= MAX_SUGGESTIONS:
+            raise ValidationError(f"limit must be between 1 and {MAX_SUGGESTIONS}")
+        if not title_index.loaded:
+            raise ServiceUnavailableError("Title index has not been built yet")
+        return title_index.suggest(query, limit)
+
+
     def remove_movie(self, movie_id: int) -> None:
-        movie = self.get_movie(movie_id)
-        if not movie:
+        if not self.repo.delete(movie_id):
             raise NotFoundError("Movie not found. Invalid id")
-        self.repo.delete(movie)
+        # its ratings go with it, consumers drop them on the movie's delete event
+        self.changes.record("movie", "delete", movie_id, movie_id)
+        self.repo.after_commit(lambda: title_index.remove(movie_id))
+
+
+    def remove_movies(self, movie_ids: Optional[List[int]] = None, title: Optional[str] = None, release_year: Optional[int] = None, genre: Optional[str] = None) -> int:
+        # refuse an empty filter, it would wipe the whole catalog
+        if movie_ids is None and not (title or release_year or genre):
+            raise ValidationError("Provide ids or at least one filter (title, release_year, genre)")
+        if movie_ids is not None and not movie_ids:
+            return 0
+        deleted = self.repo.delete_many(movie_ids, title, release_year, genre)
+        for movie_id in deleted:
+            self.changes.record("movie", "delete", movie_id, movie_id)
+        self.repo.after_commit(lambda: [title_index.remove(movie_id) for movie_id in deleted])
+        return len(deleted)
 
 
     def update_movie(self, movie_id: int, payload: dict) -> Movie:
@@ -78,4 +220,60 @@ class MovieService:
         movie.cast = payload["cast"]
         if payload.get("genres"):
             self.repo.add_genres(movie, payload["genres"])
-        return self.repo.update(movie)
\ No newline at end of file
+        movie = self.repo.update(movie)
+        self.changes.record("movie", "update", movie.id, movie.id, _movie_payload(movie))
+        self.__index_title(movie.id, movie.title)
+        return movie
+
+
+    def patch_movie(self, movie_id: int, payload: dict, expected_version: Optional[int] = None) -> Movie:
+        """Apply a partial update; only the keys present in `payload` are touched.
+
+        When `expected_version` is given the update only succeeds if the movie is still at that version.
+        """
+        movie = self.repo.get_for_update(movie_id)
+        if not movie:
+            raise NotFoundError("Movie not found. Invalid id")
+        if expected_version is not None and movie.version != expected_version:
+            raise PreconditionFailedError("Movie was modified by another request")
+
+        for field in ("title", "director_id", "release_year", "genres"):
+            if field in payload and payload[field] is None:
+                raise ValidationError(f"{field} cannot be null")
+
+        fields = {}
+        for field in ("title", "release_year", "cast"):
+            if field in payload and payload[field] != getattr(movie, field):
+                fields[field] = payload[field]
+
+        # validate director
+        if "director_id" in payload and payload["director_id"] != movie.director_id:
+            director = self.repo._get_director(payload["director_id"])
+            if not director:
+                raise ValidationError("Invalid director_id")
+            fields["director"] = director
+
+        # diff genres against the current links
+        added_genres, removed_genres = [], []
+        if "genres" in payload:
+            wanted = set(payload["genres"])
+            current = {g.id for g in movie.genres}
+            removed_genres = [g for g in movie.genres if g.id not in wanted]
+            added_ids = list(wanted - current)
+            if added_ids:
+                added_genres = self.repo._get_genres(added_ids)
+                if len(added_genres) != len(added_ids):
+                    raise ValidationError("One or more genre ids are invalid")
+
+        if not fields and not added_genres and not removed_genres:
+            return movie
+        movie = self.repo.patch(movie, fields, added_genres, removed_genres)
+        self.changes.record("movie", "update", movie.id, movie.id, _movie_payload(movie))
+        if "title" in fields:
+            self.__index_title(movie.id, movie.title)
+        return movie
+
+
+    def __index_title(self, movie_id: int, title: str) -> None:
+        # applied after commit only, a rolled back write never shows up in suggestions
+        self.repo.after_commit(lambda: title_index.upsert(movie_id, title))
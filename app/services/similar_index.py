@@ -0,0 +1,299 @@
+"""Precomputed "more like this" index.
+
+Every movie is encoded as NumPy features (genres, director, release year and the shape of
+its rating distribution). The top-K most similar movies of each movie are computed offline
+with vectorized, chunked scoring over the whole catalog and stored as `.npy` files that the
+API memory-maps, so a lookup is a binary search plus a row slice.
+
+On disk an index is a build directory holding three arrays, and a `CURRENT` file naming the
+build in use; it is replaced atomically, so readers never see a half-written index:
+
+    <SIMILAR_INDEX_DIR>/CURRENT
+    <SIMILAR_INDEX_DIR>/<build>/ids.npy         int32[N]    sorted movie ids
+    <SIMILAR_INDEX_DIR>/<build>/neighbours.npy  int32[N,K]  similar movie ids, best first, -1 padded
+    <SIMILAR_INDEX_DIR>/<build>/scores.npy      float32[N,K]
+    <SIMILAR_INDEX_DIR>/<build>/CURSOR          change feed cursor the build is current up to
+
+The launcher refreshes the index periodically from the movies the change feed reports as
+changed since the CURSOR of the current build (see `app.scripts.build_similar_index`).
+"""
+import logging
+import os
+import shutil
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+SIMILAR_INDEX_DIR = os.getenv("SIMILAR_INDEX_DIR", "similar_index")
+SIMILAR_INDEX_TOP_K = int(os.getenv("SIMILAR_INDEX_TOP_K", "20"))
+# memory budget of one block of the N x N score matrix
+SIMILAR_INDEX_CHUNK_BYTES = int(os.getenv("SIMILAR_INDEX_CHUNK_BYTES", str(64 * 1024 * 1024)))
+# how often a worker checks whether a newer build was published
+SIMILAR_INDEX_RELOAD_SECONDS = float(os.getenv("SIMILAR_INDEX_RELOAD_SECONDS", "30"))
+
+GENRE_WEIGHT = 0.5
+DIRECTOR_WEIGHT = 0.2
+YEAR_WEIGHT = 0.15
+RATING_WEIGHT = 0.15
+# release years this far apart score exp(-1) on the year component
+YEAR_SCALE = 10.0
+# builds kept on disk, so workers still mapping the previous one are not pulled from under
+BUILDS_TO_KEEP = 2
+BUILD_NAME_FORMAT = "%Y%m%dT%H%M%S%fZ"
+
+logger = logging.getLogger("movie_rating")
+
+
+@dataclass
+class CatalogFeatures:
+    ids: np.ndarray              # int32[N], sorted
+    genres: np.ndarray           # float32[N, G], L2-normalised genre one-hot rows
+    directors: np.ndarray        # int32[N]
+    years: np.ndarray            # float32[N]
+    rating_profile: np.ndarray   # float32[N, 10], L2-normalised score histograms
+
+
+def build_features(
+        movies: Sequence[Tuple[int, int, int]],
+        genre_links: Iterable[Tuple[int, int]],
+        score_counts: Iterable[Tuple[int, int, int]],
+) -> CatalogFeatures:
+    """Encode the catalog from (id, director_id, release_year), (movie_id, genre_id) and (movie_id, score, count) rows."""
+    movies = sorted(movies)
+    ids = np.fromiter((m[0] for m in movies), dtype=np.int32, count=len(movies))
+    directors = np.fromiter((m[1] for m in movies), dtype=np.int32, count=len(movies))
+    years = np.fromiter((m[2] for m in movies), dtype=np.float32, count=len(movies))
+
+    links = np.array(list(genre_links), dtype=np.int64).reshape(-1, 2)
+    links = links[np.isin(links[:, 0], ids)]
+    genre_ids, genre_columns = np.unique(links[:, 1], return_inverse=True)
+    genres = np.zeros((len(ids), len(genre_ids)), dtype=np.float32)
+    genres[np.searchsorted(ids, links[:, 0]), genre_columns] = 1.0
+
+    counts = np.array(list(score_counts), dtype=np.int64).reshape(-1, 3)
+    counts = counts[np.isin(counts[:, 0], ids) & (counts[:, 1] >= 1) & (counts[:, 1] <= 10)]
+    rating_profile = np.zeros((len(ids), 10), dtype=np.float32)
+    rating_profile[np.searchsorted(ids, counts[:, 0]), counts[:, 1] - 1] = counts[:, 2]
+
+    return CatalogFeatures(ids, _normalise_rows(genres), directors, years, _normalise_rows(rating_profile))
+
+
+def _normalise_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return np.divide(matrix, norms, out=np.zeros_like(matrix), where=norms > 0)
+
+
+def _score_block(features: CatalogFeatures, rows: np.ndarray, columns: Optional[np.ndarray] = None) -> np.ndarray:
+    """Similarity of the movies at positions `rows` against those at `columns` (all when None)."""
+    take = (lambda a: a) if columns is None else (lambda a: a[columns])
+    scores = GENRE_WEIGHT * (features.genres[rows] @ take(features.genres).T)
+    scores += RATING_WEIGHT * (features.rating_profile[rows] @ take(features.rating_profile).T)
+    scores += DIRECTOR_WEIGHT * (features.directors[rows, None] == take(features.directors)[None, :])
+    scores += YEAR_WEIGHT * np.exp(-np.abs(features.years[rows, None] - take(features.years)[None, :]) / YEAR_SCALE)
+    return scores
+
+
+def _top_k(scores: np.ndarray, candidate_ids: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Best `k` candidates per row, best first; rows with fewer than `k` finite scores are -1 padded."""
+    neighbours = np.full((scores.shape[0], k), -1, dtype=np.int32)
+    top_scores = np.zeros((scores.shape[0], k), dtype=np.float32)
+    width = min(k, scores.shape[1])
+    if width == 0:
+        return neighbours, top_scores
+    if width < scores.shape[1]:
+        picked = np.argpartition(-scores, width - 1, axis=1)[:, :width]
+    else:
+        picked = np.broadcast_to(np.arange(width), (scores.shape[0], width))
+    picked_scores = np.take_along_axis(scores, picked, axis=1)
+    order = np.argsort(-picked_scores, axis=1, kind="stable")
+    picked = np.take_along_axis(picked, order, axis=1)
+    picked_scores = np.take_along_axis(picked_scores, order, axis=1)
+    valid = np.isfinite(picked_scores)
+    neighbours[:, :width] = np.where(valid, candidate_ids[picked], -1)
+    top_scores[:, :width] = np.where(valid, picked_scores, 0.0)
+    return neighbours, top_scores
+
+
+def _chunk_rows(catalog_size: int) -> int:
+    return max(1, SIMILAR_INDEX_CHUNK_BYTES // (max(catalog_size, 1) * 4 * 4))
+
+
+def compute_neighbours(features: CatalogFeatures, rows: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Top-k neighbours of the movies at positions `rows`, scored against the whole catalog in chunks."""
+    neighbours = np.empty((len(rows), k), dtype=np.int32)
+    scores = np.empty((len(rows), k), dtype=np.float32)
+    step = _chunk_rows(len(features.ids))
+    for start in range(0, len(rows), step):
+        chunk = rows[start:start + step]
+        block = _score_block(features, chunk)
+        block[np.arange(len(chunk)), chunk] = -np.inf  # a movie is not similar to itself
+        neighbours[start:start + step], scores[start:start + step] = _top_k(block, features.ids, k)
+    return neighbours, scores
+
+
+def build_index(features: CatalogFeatures, k: int = SIMILAR_INDEX_TOP_K) -> Tuple[np.ndarray, np.ndarray]:
+    return compute_neighbours(features, np.arange(len(features.ids)), k)
+
+
+def refresh_index(
+        features: CatalogFeatures,
+        old_ids: np.ndarray,
+        old_neighbours: np.ndarray,
+        old_scores: np.ndarray,
+        changed_ids: Iterable[int],
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Update an existing index after the movies in `changed_ids` were created, updated or deleted.
+
+    Rows of changed movies, and rows whose neighbour list mentions a changed or deleted movie,
+    are recomputed against the whole catalog. Every other row keeps its list and only has the
+    changed movies merged in as new candidates, which costs O(N * changed) instead of O(N^2).
+    """
+    k = old_neighbours.shape[1]
+    changed = np.union1d(
+        np.intersect1d(np.fromiter(changed_ids, dtype=np.int64), features.ids),
+        np.setdiff1d(features.ids, old_ids),  # movies that were never indexed
+    ).astype(np.int32)
+    gone = np.union1d(np.setdiff1d(old_ids, features.ids), changed)
+
+    neighbours = np.full((len(features.ids), k), -1, dtype=np.int32)
+    scores = np.zeros((len(features.ids), k), dtype=np.float32)
+    kept = np.isin(features.ids, old_ids)
+    old_rows = np.searchsorted(old_ids, features.ids[kept])
+    neighbours[kept] = old_neighbours[old_rows]
+    scores[kept] = old_scores[old_rows]
+
+    stale = ~kept | np.isin(features.ids, changed) | np.isin(neighbours, gone).any(axis=1)
+    stale_rows = np.flatnonzero(stale)
+    neighbours[stale_rows], scores[stale_rows] = compute_neighbours(features, stale_rows, k)
+
+    merge_rows = np.flatnonzero(~stale)
+    changed_columns = np.searchsorted(features.ids, changed)
+    if len(changed_columns) and len(merge_rows):
+        step = _chunk_rows(len(changed_columns) + k)
+        for start in range(0, len(merge_rows), step):
+            chunk = merge_rows[start:start + step]
+            candidates = _score_block(features, chunk, changed_columns)
+            current = np.where(neighbours[chunk] >= 0, scores[chunk], -np.inf)
+            candidate_ids = np.broadcast_to(changed, candidates.shape)
+            merged_scores = np.concatenate([current, candidates], axis=1)
+            merged_ids = np.concatenate([neighbours[chunk], candidate_ids], axis=1)
+            picked = np.argsort(-merged_scores, axis=1, kind="stable")[:, :k]
+            picked_scores = np.take_along_axis(merged_scores, picked, axis=1)
+            valid = np.isfinite(picked_scores)
+            neighbours[chunk] = np.where(valid, np.take_along_axis(merged_ids, picked, axis=1), -1)
+            scores[chunk] = np.where(valid, picked_scores, 0.0)
+    return neighbours, scores
+
+
+def save_index(
+        directory: str,
+        ids: np.ndarray,
+        neighbours: np.ndarray,
+        scores: np.ndarray,
+        cursor: Optional[str] = None,
+) -> str:
+    """Write a new build next to the current one and switch CURRENT to it."""
+    os.makedirs(directory, exist_ok=True)
+    build = datetime.now(timezone.utc).strftime(BUILD_NAME_FORMAT)
+    build_dir = os.path.join(directory, build)
+    os.makedirs(build_dir)
+    np.save(os.path.join(build_dir, "ids.npy"), ids.astype(np.int32))
+    np.save(os.path.join(build_dir, "neighbours.npy"), neighbours.astype(np.int32))
+    np.save(os.path.join(build_dir, "scores.npy"), scores.astype(np.float32))
+    if cursor is not None:
+        with open(os.path.join(build_dir, "CURSOR"), "w") as f:
+            f.write(cursor)
+
+    pointer = os.path.join(directory, "CURRENT")
+    with open(pointer + ".tmp", "w") as f:
+        f.write(build)
+    os.replace(pointer + ".tmp", pointer)
+
+    builds = sorted(name for name in os.listdir(directory) if os.path.isdir(os.path.join(directory, name)))
+    for old in builds[:-BUILDS_TO_KEEP]:
+        shutil.rmtree(os.path.join(directory, old), ignore_errors=True)
+    return build
+
+
+class SimilarMoviesIndex:
+    """Read side of the index: memory-maps the current build and answers lookups without the database."""
+
+    def __init__(self, directory: str = SIMILAR_INDEX_DIR, reload_seconds: float = SIMILAR_INDEX_RELOAD_SECONDS):
+        self.directory = directory
+        self.reload_seconds = reload_seconds
+        self.build: Optional[str] = None
+        self.ids: Optional[np.ndarray] = None
+        self.neighbours: Optional[np.ndarray] = None
+        self.scores: Optional[np.ndarray] = None
+        self.cursor: Optional[str] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _current_build(self) -> Optional[str]:
+        try:
+            with open(os.path.join(self.directory, "CURRENT")) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def load(self) -> bool:
+        """(Re)map the current build if it changed; returns whether an index is available."""
+        with self._lock:
+            self._checked_at = time.monotonic()
+            build = self._current_build()
+            if build and build != self.build:
+                build_dir = os.path.join(self.directory, build)
+                try:
+                    ids = np.load(os.path.join(build_dir, "ids.npy"), mmap_mode="r")
+                    neighbours = np.load(os.path.join(build_dir, "neighbours.npy"), mmap_mode="r")
+                    scores = np.load(os.path.join(build_dir, "scores.npy"), mmap_mode="r")
+                except (OSError, ValueError) as e:
+                    # a deleted or truncated build must not fail requests; keep serving what is mapped
+                    logger.warning(f"Similar movies index build {build} could not be loaded: {str(e)}")
+                    return self.ids is not None
+                self.ids, self.neighbours, self.scores, self.build = ids, neighbours, scores, build
+                self.cursor = self._build_cursor(build_dir)
+            return self.ids is not None
+
+    @staticmethod
+    def _build_cursor(build_dir: str) -> Optional[str]:
+        try:
+            with open(os.path.join(build_dir, "CURSOR")) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    @property
+    def available(self) -> bool:
+        if time.monotonic() - self._checked_at > self.reload_seconds:
+            self.load()
+        return self.ids is not None
+
+    def stats(self) -> dict:
+        """State of the mapped build; never reloads, so it is safe to call from the event loop."""
+        built_at = datetime.strptime(self.build, BUILD_NAME_FORMAT).replace(tzinfo=timezone.utc) if self.build else None
+        return {
+            "available": self.ids is not None,
+            "build": self.build,
+            "movies": len(self.ids) if self.ids is not None else 0,
+            "built_at": built_at.isoformat() if built_at else None,
+            "age_seconds": round((datetime.now(timezone.utc) - built_at).total_seconds(), 1) if built_at else None,
+            "cursor": self.cursor,
+        }
+
+    def lookup(self, movie_id: int, limit: int) -> Optional[List[Tuple[int, float]]]:
+        """Similar movies as (movie_id, score), best first; None when the movie is not indexed."""
+        ids, neighbours, scores = self.ids, self.neighbours, self.scores
+        row = int(np.searchsorted(ids, movie_id))
+        if row >= len(ids) or ids[row] != movie_id:
+            return None
+        found = neighbours[row, :limit]
+        found_scores = scores[row, :limit]
+        return [(int(n), round(float(s), 4)) for n, s in zip(found, found_scores) if n >= 0]
+
+
+similar_index = SimilarMoviesIndex()
@@ -0,0 +1,120 @@
+"""Request coalescing ("single-flight") for identical concurrent reads.
+
+The first caller for a key (the leader) runs the function; callers arriving with the same key
+while it runs wait for it and get the same result, or the same exception, instead of running
+their own identical queries. Every waiter raises its own copy of the exception, chained to the
+leader's, since concurrent raises of one instance would overwrite each other's traceback. Results are shared between threads, so functions passed here must
+return values that are safe to share (Pydantic models, not ORM objects bound to a session).
+
+Sync endpoints run on a thread pool, so this is thread based. A leader can not be cancelled
+half way, but it can die with a BaseException (e.g. a worker shutting down); waiting callers
+then elect a new leader instead of inheriting that exception. Callers never wait longer than
+SINGLEFLIGHT_WAIT_TIMEOUT for a leader and run the function themselves after that.
+"""
+import os
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional, TypeVar
+
+SINGLEFLIGHT_ENABLED = os.getenv("SINGLEFLIGHT_ENABLED", "true").lower() == "true"
+SINGLEFLIGHT_WAIT_TIMEOUT = float(os.getenv("SINGLEFLIGHT_WAIT_TIMEOUT", "5"))
+
+T = TypeVar("T")
+
+
+def _copy_error(error: Exception) -> Exception:
+    """Same class, args and attributes as `error`, without calling __init__ (whose signature varies,
+    e.g. SQLAlchemy's DBAPIError does not take its own args back)."""
+    copy = type(error).__new__(type(error), *error.args)
+    copy.args = error.args
+    copy.__dict__.update(error.__dict__)
+    return copy
+
+
+class _Call:
+    __slots__ = ("done", "result", "error", "abandoned")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[Exception] = None
+        self.abandoned = False
+
+
+class SingleFlight:
+    def __init__(self, name: str, wait_timeout: float = SINGLEFLIGHT_WAIT_TIMEOUT, enabled: bool = SINGLEFLIGHT_ENABLED):
+        self.name = name
+        self.wait_timeout = wait_timeout
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        # executions: calls that ran the function; shared: calls answered by another call's execution
+        self.executions = 0
+        self.shared = 0
+        self.timeouts = 0
+
+
+    def do(self, key: Hashable, fn: Callable[[], T]) -> T:
+        if not self.enabled:
+            return fn()
+
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                leader = call is None
+                if leader:
+                    call = _Call()
+                    self._calls[key] = call
+                    self.executions += 1
+
+            if leader:
+                return self.__lead(key, call, fn)
+
+            if not call.done.wait(self.wait_timeout):
+                # the leader is stuck: don't pile up behind it
+                with self._lock:
+                    self.timeouts += 1
+                    self.executions += 1
+                return fn()
+            if call.abandoned:
+                continue
+            with self._lock:
+                self.shared += 1
+            if call.error is not None:
+                raise _copy_error(call.error) from call.error
+            return call.result
+
+
+    def __lead(self, key: Hashable, call: _Call, fn: Callable[[], T]) -> T:
+        try:
+            call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        except BaseException:
+            call.abandoned = True
+            raise
+        finally:
+            # new callers start a fresh execution from here on; waiters read the finished call
+            with self._lock:
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+            call.done.set()
+
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.executions + self.shared
+            return {
+                "enabled": self.enabled,
+                "requests": total,
+                "executions": self.executions,
+                "shared": self.shared,
+                "wait_timeouts": self.timeouts,
+                "in_flight": len(self._calls),
+                "coalescing_ratio": round(self.shared / total, 4) if total else 0.0,
+            }
+
+
+movie_details_flight = SingleFlight("movie_details")
+movie_list_flight = SingleFlight("movie_list")
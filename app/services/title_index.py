@@ -0,0 +1,284 @@
+"""In-memory title autocomplete index.
+
+Titles are normalized (accents stripped, case folded, punctuation turned into spaces) and every
+word start of a title becomes a key, so "dark kn" finds "The Dark Knight". Keys are kept in a
+sorted array with the movie id in a parallel array; the movies matching a prefix are one
+contiguous slice found by binary search, ranked by rating count.
+
+Memory is bounded by truncating keys to TITLE_INDEX_KEY_LENGTH characters and indexing at most
+TITLE_INDEX_MAX_WORDS word starts per title. Prefixes matching more than SCAN_LIMIT keys (one or
+two letters on a large catalog) are too wide to rank on every keystroke; their top matches are
+cached and kept current as ratings come in.
+
+The API keeps the index current with incremental updates after each commit. Other workers'
+writes are picked up by a full rebuild every TITLE_INDEX_REFRESH_SECONDS.
+"""
+import heapq
+import logging
+import os
+import threading
+import unicodedata
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+TITLE_INDEX_KEY_LENGTH = int(os.getenv("TITLE_INDEX_KEY_LENGTH", "32"))
+TITLE_INDEX_MAX_WORDS = int(os.getenv("TITLE_INDEX_MAX_WORDS", "6"))
+TITLE_INDEX_REFRESH_SECONDS = float(os.getenv("TITLE_INDEX_REFRESH_SECONDS", "300"))
+
+# largest number of suggestions a request may ask for; also the size of cached top lists
+MAX_SUGGESTIONS = 20
+# prefixes matching more keys than this are answered from the top list cache
+SCAN_LIMIT = 512
+TOP_CACHE_SIZE = 1024
+
+logger = logging.getLogger("movie_rating")
+
+
+# ASCII punctuation and control characters become word separators
+_ASCII_SEPARATORS = str.maketrans({chr(c): " " for c in range(128) if not chr(c).isalnum()})
+
+
+def normalize_title(title: str) -> str:
+    folded = title.casefold()
+    if folded.isascii():
+        folded = folded.translate(_ASCII_SEPARATORS)
+    else:
+        decomposed = unicodedata.normalize("NFKD", folded)
+        folded = "".join(c if c.isalnum() else " " for c in decomposed if not unicodedata.combining(c))
+    return " ".join(folded.split())
+
+
+def title_keys(title: str) -> List[str]:
+    """Keys of a title: the normalized title from each of its first word starts, truncated."""
+    normalized = normalize_title(title)
+    keys, start = [], 0
+    while start < len(normalized) and len(keys) < TITLE_INDEX_MAX_WORDS:
+        keys.append(normalized[start:start + TITLE_INDEX_KEY_LENGTH])
+        next_space = normalized.find(" ", start)
+        if next_space < 0:
+            break
+        start = next_space + 1
+    return list(dict.fromkeys(keys))
+
+
+class TitleIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys: List[str] = []
+        self._ids: List[int] = []
+        # movie id -> (title, ratings count)
+        self._movies: Dict[int, Tuple[str, int]] = {}
+        # prefix -> best movie ids, for prefixes wider than SCAN_LIMIT
+        self._top: "OrderedDict[str, List[int]]" = OrderedDict()
+        self._loaded = False
+        # changes committed while a rebuild reads the catalog, replayed onto the rebuilt index
+        self._rebuilding = False
+        self._missed: List[Tuple[str, int, object]] = []
+        self._stop = threading.Event()
+
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+
+    def __len__(self) -> int:
+        return len(self._movies)
+
+
+    def build(self, rows: Iterable[Tuple[int, str, int]]) -> None:
+        """Replace the index with (movie_id, title, ratings_count) rows."""
+        keys, ids, movies = self.__prepare(rows)
+        with self._lock:
+            self.__install(keys, ids, movies)
+
+
+    def rebuild(self, load_rows: Callable[[], Iterable[Tuple[int, str, int]]]) -> None:
+        """Rebuild from the database without losing changes committed while it loads.
+
+        Changes made from the start of the load until the new arrays are installed are recorded
+        and replayed onto them under the same lock acquisition that installs them. A ratings
+        increment committed before the load's snapshot is counted twice until the next refresh;
+        overcounting a little is preferred to dropping it.
+        """
+        with self._lock:
+            self._rebuilding = True
+            self._missed = []
+        try:
+            keys, ids, movies = self.__prepare(load_rows())
+        except BaseException:
+            with self._lock:
+                self._rebuilding = False
+                self._missed = []
+            raise
+        with self._lock:
+            missed = self._missed
+            self._rebuilding = False
+            self._missed = []
+            self.__install(keys, ids, movies)
+            for op, movie_id, value in missed:
+                if op == "upsert":
+                    self.__upsert(movie_id, value)
+                elif op == "remove":
+                    self.__remove(movie_id)
+                else:
+                    self.__add_ratings(movie_id, value)
+
+
+    def upsert(self, movie_id: int, title: str, ratings_count: Optional[int] = None) -> None:
+        """Add a movie or change its title; the ratings count is kept unless given."""
+        with self._lock:
+            if self._rebuilding:
+                self._missed.append(("upsert", movie_id, title))
+            self.__upsert(movie_id, title, ratings_count)
+
+
+    def remove(self, movie_id: int) -> None:
+        with self._lock:
+            if self._rebuilding:
+                self._missed.append(("remove", movie_id, None))
+            self.__remove(movie_id)
+
+
+    def add_ratings(self, movie_id: int, count: int = 1) -> None:
+        with self._lock:
+            if self._rebuilding:
+                self._missed.append(("ratings", movie_id, count))
+            self.__add_ratings(movie_id, count)
+
+
+    def suggest(self, query: str, limit: int = 10) -> List[Tuple[int, str, int]]:
+        """Up to `limit` (movie_id, title, ratings_count) whose title has a word starting with `query`."""
+        prefix = normalize_title(query)
+        if not prefix:
+            return []
+        truncated = prefix[:TITLE_INDEX_KEY_LENGTH]
+        with self._lock:
+            low = bisect_left(self._keys, truncated)
+            high = bisect_left(self._keys, truncated + "\U0010ffff", low)
+            if high - low > SCAN_LIMIT:
+                candidates = self.__cached_top(truncated, low, high)
+            else:
+                candidates = set(self._ids[low:high])
+            if len(prefix) > len(truncated):
+                # keys are truncated, so long queries are checked against the full title
+                candidates = [m for m in candidates if (" " + normalize_title(self._movies[m][0])).find(" " + prefix) >= 0]
+            best = heapq.nsmallest(limit, candidates, key=self.__rank)
+            return [(movie_id, *self._movies[movie_id]) for movie_id in best]
+
+
+    def start_refresh(self, load_rows: Callable[[], Iterable[Tuple[int, str, int]]], interval: float = TITLE_INDEX_REFRESH_SECONDS) -> None:
+        """Rebuild from `load_rows` every `interval` seconds on a daemon thread."""
+        if interval <= 0:
+            return
+        self._stop.clear()
+
+        def refresh():
+            while not self._stop.wait(interval):
+                try:
+                    self.rebuild(load_rows)
+                except Exception as e:
+                    logger.error(f"Refreshing the title index failed: {str(e)}", exc_info=True)
+
+        threading.Thread(target=refresh, name="title-index-refresh", daemon=True).start()
+
+
+    def stop_refresh(self) -> None:
+        self._stop.set()
+
+
+    def __prepare(self, rows: Iterable[Tuple[int, str, int]]) -> Tuple[List[str], List[int], Dict[int, Tuple[str, int]]]:
+        # sorting is the expensive part of a build, done before taking the lock
+        movies = {movie_id: (title, count) for movie_id, title, count in rows}
+        entries = sorted((key, movie_id) for movie_id, (title, _) in movies.items() for key in title_keys(title))
+        return [key for key, _ in entries], [movie_id for _, movie_id in entries], movies
+
+
+    def __install(self, keys: List[str], ids: List[int], movies: Dict[int, Tuple[str, int]]) -> None:
+        self._keys, self._ids, self._movies = keys, ids, movies
+        self._top.clear()
+        self._loaded = True
+
+
+    def __upsert(self, movie_id: int, title: str, ratings_count: Optional[int] = None) -> None:
+        previous = self._movies.get(movie_id)
+        if previous is not None:
+            self.__unlink(movie_id, previous[0])
+            self.__forget_top(previous[0])
+        count = ratings_count if ratings_count is not None else (previous[1] if previous else 0)
+        self._movies[movie_id] = (title, count)
+        for key in title_keys(title):
+            position = bisect_left(self._keys, key)
+            while position < len(self._keys) and self._keys[position] == key and self._ids[position] < movie_id:
+                position += 1
+            self._keys.insert(position, key)
+            self._ids.insert(position, movie_id)
+        self.__forget_top(title)
+
+
+    def __remove(self, movie_id: int) -> None:
+        previous = self._movies.pop(movie_id, None)
+        if previous is not None:
+            self.__unlink(movie_id, previous[0])
+            self.__forget_top(previous[0])
+
+
+    def __add_ratings(self, movie_id: int, count: int) -> None:
+        current = self._movies.get(movie_id)
+        if current is None:
+            return
+        title, ratings_count = current
+        ratings_count += count
+        self._movies[movie_id] = (title, ratings_count)
+        # a count that only grew can keep the cached top lists exact without a rescan
+        for prefix in self.__cached_prefixes(title):
+            top = self._top[prefix]
+            if movie_id not in top:
+                if len(top) == MAX_SUGGESTIONS and ratings_count <= self._movies[top[-1]][1]:
+                    continue
+                top.append(movie_id)
+            top.sort(key=self.__rank)
+            del top[MAX_SUGGESTIONS:]
+
+
+    def __rank(self, movie_id: int) -> Tuple[int, int]:
+        # most rated first, ties broken by id so results are stable
+        return -self._movies[movie_id][1], movie_id
+
+
+    def __unlink(self, movie_id: int, title: str) -> None:
+        for key in title_keys(title):
+            position = bisect_left(self._keys, key)
+            while position < len(self._keys) and self._keys[position] == key:
+                if self._ids[position] == movie_id:
+                    del self._keys[position]
+                    del self._ids[position]
+                    break
+                position += 1
+
+
+    def __cached_prefixes(self, title: str) -> set:
+        if not self._top:
+            return set()
+        return {key[:n] for key in title_keys(title) for n in range(1, len(key) + 1) if key[:n] in self._top}
+
+
+    def __forget_top(self, title: str) -> None:
+        for prefix in self.__cached_prefixes(title):
+            del self._top[prefix]
+
+
+    def __cached_top(self, prefix: str, low: int, high: int) -> List[int]:
+        top = self._top.get(prefix)
+        if top is None:
+            top = heapq.nsmallest(MAX_SUGGESTIONS, set(self._ids[low:high]), key=self.__rank)
+            self._top[prefix] = top
+            if len(self._top) > TOP_CACHE_SIZE:
+                self._top.popitem(last=False)
+        else:
+            self._top.move_to_end(prefix)
+        return top
+
+
+title_index = TitleIndex()